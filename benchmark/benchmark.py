@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+import typer
+import httpx
+from contextlib import redirect_stdout
+import numpy as np
+from datetime import datetime, timezone
+from typing import Annotated, Optional
+from benchmark.fakes import FakeChatModel, FakeEmbeddings
+from config import Settings
+from graph import initial_state
+from metrics.metrics import RequestTimings, metrics, request_timings
+from resources import AppResources
+from search.search import StubBackend
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(__file__), "questions.json")
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    values_ms = np.asarray(values) * 1000
+    return {
+        "p50": round(float(np.percentile(values_ms, 50)), 1),
+        "p95": round(float(np.percentile(values_ms, 95)), 1),
+        "p99": round(float(np.percentile(values_ms, 99)), 1),
+        "mean": round(float(values_ms.mean()), 1),
+        "max": round(float(values_ms.max()), 1),
+    }
+
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    stages = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, duration = entry.partition(";dur=")
+        stages[name] = float(duration)
+    return stages
+
+
+async def replay(
+    resources: AppResources,
+    questions: list[str],
+    concurrency: int,
+    target: str,
+) -> tuple[float, list[float], list[dict[str, float]], int]:
+    """Send every question with at most `concurrency` in flight; returns wall time,
+    latencies, per-request stage timings (ms) and the error count
+    """
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for question in questions:
+        queue.put_nowait(question)
+
+    latencies: list[float] = []
+    stages: list[dict[str, float]] = []
+    errors = 0
+
+    client = None
+    if target == "server":
+        import server
+
+        server.app.state.resources = resources
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=server.app),
+            base_url="http://benchmark",
+            timeout=None,
+        )
+
+    async def ask(question: str) -> dict[str, float]:
+        if client is not None:
+            response = await client.post(
+                "/ask", params={"timings": "true"}, json={"question": question}
+            )
+            response.raise_for_status()
+            return parse_server_timing(response.headers.get("Server-Timing", ""))
+
+        timings = RequestTimings()
+        request_timings.set(timings)
+        await resources.graph.ainvoke(initial_state(question))
+        return timings.as_dict()
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            question = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                stages.append(await ask(question))
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                print(f"Request failed: {e}", file=sys.stderr)
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_seconds = time.perf_counter() - started
+
+    if client is not None:
+        await client.aclose()
+    await resources.aclose()
+    return wall_seconds, latencies, stages, errors
+
+
+def main(
+    questions_path: Annotated[str, typer.Option("--questions")] = QUESTIONS_PATH,
+    pdf_directory: Annotated[Optional[str], typer.Option()] = None,
+    index_directory: Annotated[
+        Optional[str], typer.Option(help="Defaults to a fresh temporary directory")
+    ] = None,
+    concurrency: Annotated[int, typer.Option(help="Requests in flight")] = 8,
+    repeat: Annotated[int, typer.Option(help="Times the question set is replayed")] = 3,
+    target: Annotated[
+        str, typer.Option(help="'graph' runs the workflow, 'server' goes through /ask")
+    ] = "graph",
+    llm_latency: Annotated[float, typer.Option(help="Seconds per LLM call")] = 0.5,
+    token_latency: Annotated[
+        float, typer.Option(help="Seconds per streamed answer word")
+    ] = 0.0,
+    embedding_latency: Annotated[
+        float, typer.Option(help="Seconds per embedding call")
+    ] = 0.05,
+    search_latency: Annotated[float, typer.Option(help="Seconds per web search")] = 0.8,
+    relevancy: Annotated[
+        str, typer.Option(help="Verdict of the fake LLM document reviewer")
+    ] = "relevant",
+    response_cache: Annotated[
+        bool, typer.Option(help="Keep the response cache on (repeats become hits)")
+    ] = False,
+    output: Annotated[
+        Optional[str], typer.Option(help="Write the JSON report here instead of stdout")
+    ] = None,
+):
+    """Replay a question set against the real workflow with local stand-ins for the
+    chat model, embeddings and web search, and report latency and throughput as JSON
+    """
+    with open(questions_path) as f:
+        questions = json.load(f) * repeat
+
+    overrides = {
+        "index_directory": index_directory or tempfile.mkdtemp(prefix="rag-benchmark-"),
+        # Keeps fake vectors from ever sharing index entries with real ones
+        "embedding_model": FakeEmbeddings.model,
+        "embedding_dimensions": None,
+        # Fake answers must not land in persistent caches shared with real runs
+        "memo_cache_path": None,
+        "session_store_path": None,
+        "response_cache_enabled": response_cache,
+        "watch_interval_seconds": 0,
+        "search_backend": "stub",
+        # tiktoken would download its BPE files on first use
+        "tokenizer": "words",
+    }
+    if pdf_directory is not None:
+        overrides["pdf_directory"] = pdf_directory
+    settings = Settings.from_env().model_copy(update=overrides)
+
+    if target not in ("graph", "server"):
+        raise typer.BadParameter("target must be 'graph' or 'server'")
+
+    # Progress output goes to stderr so stdout carries only the report
+    with redirect_stdout(sys.stderr):
+        started = time.perf_counter()
+        resources = AppResources(
+            settings,
+            chat_model=FakeChatModel(
+                latency_seconds=llm_latency,
+                token_latency_seconds=token_latency,
+                relevancy=relevancy,
+            ),
+            embedding=FakeEmbeddings(latency_seconds=embedding_latency),
+            search_backend=StubBackend(latency_seconds=search_latency),
+        )
+        startup_seconds = time.perf_counter() - started
+        ingest = metrics.histograms.get("rag_ingest_seconds", {}).get((), [[], 0.0, 0])
+
+        wall_seconds, latencies, stages, errors = asyncio.run(
+            replay(resources, questions, concurrency, target)
+        )
+
+    stage_names = sorted({name for timings in stages for name in timings})
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "target": target,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 3),
+        "requests_per_second": round(len(latencies) / wall_seconds, 2),
+        "latency_ms": percentiles(latencies),
+        "stages_ms": {
+            name: percentiles(
+                [timings[name] / 1000 for timings in stages if name in timings]
+            )
+            for name in stage_names
+        },
+        "ingestion": {
+            "startup_seconds": round(startup_seconds, 3),
+            "ingest_seconds": round(ingest[1], 3),
+            "files": len(resources.vector_store.manifest),
+            "chunks": len(resources.vector_store.texts),
+        },
+        "answer_paths": {
+            dict(labels)["path"]: int(count)
+            for labels, count in metrics.counters["rag_answer_path_total"].items()
+        },
+        "fake_latency_seconds": {
+            "llm": llm_latency,
+            "token": token_latency,
+            "embedding": embedding_latency,
+            "search": search_latency,
+        },
+        "settings": settings.model_dump(
+            include={
+                "planner_mode",
+                "speculative_research",
+                "concurrent_web_search",
+                "retrieval_mode",
+                "relevance_gate_enabled",
+                "vector_index",
+                "vector_precision",
+                "top_k",
+                "tokenizer",
+                "chunk_size",
+                "child_chunk_size",
+                "context_budget_tokens",
+                "fast_path_mode",
+                "embedding_batch_window_ms",
+                "max_concurrent_llm_calls",
+                "admission_max_in_flight",
+            }
+        ),
+    }
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    typer.run(main)
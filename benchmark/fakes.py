@@ -0,0 +1,156 @@
+import time
+import asyncio
+import hashlib
+import numpy as np
+from typing import Any, Iterator, AsyncIterator
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from vector_store.lexical import tokenize
+
+
+def count_words(messages: list[BaseMessage]) -> int:
+    return sum(len(str(message.content).split()) for message in messages)
+
+
+class FakeChatModel(BaseChatModel):
+    """Local stand-in for the OpenAI chat model: waits `latency_seconds` before
+    answering (plus `token_latency_seconds` per streamed word) and reports token
+    usage estimated from word counts.
+    """
+
+    latency_seconds: float = 0.5
+    token_latency_seconds: float = 0.0
+    answer_words: int = 150
+    route: str = "research"
+    relevancy: str = "relevant"
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake"
+
+    def _answer(self, messages: list[BaseMessage]) -> list[str]:
+        question = str(messages[-1].content).split()
+        return [
+            question[i % len(question)] if question else "answer"
+            for i in range(self.answer_words)
+        ]
+
+    def _usage(self, messages: list[BaseMessage], words: int) -> dict:
+        # Roughly 4 tokens for every 3 English words
+        input_tokens = count_words(messages) * 4 // 3
+        output_tokens = words * 4 // 3
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    def _result(self, messages: list[BaseMessage]) -> ChatResult:
+        words = self._answer(messages)
+        message = AIMessage(
+            content=" ".join(words), usage_metadata=self._usage(messages, len(words))
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_seconds)
+        return self._result(messages)
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency_seconds)
+        return self._result(messages)
+
+    def _stream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency_seconds)
+        words = self._answer(messages)
+        for word in words:
+            time.sleep(self.token_latency_seconds)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=f"{word} "))
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="", usage_metadata=self._usage(messages, len(words))
+            )
+        )
+
+    async def _astream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency_seconds)
+        words = self._answer(messages)
+        for word in words:
+            await asyncio.sleep(self.token_latency_seconds)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=f"{word} "))
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="", usage_metadata=self._usage(messages, len(words))
+            )
+        )
+
+    def with_structured_output(self, schema, **kwargs: Any):
+        """Fill `route`/`relevancy` from the configured decisions and any other
+        field with the last message, after a normal (instrumented) model call.
+        """
+
+        decisions = {"route": self.route, "relevancy": self.relevancy}
+
+        def build(messages: list[BaseMessage]):
+            values = {
+                name: decisions.get(name, str(messages[-1].content))
+                for name in schema.model_fields
+            }
+            return schema(**values)
+
+        def invoke(messages):
+            self.invoke(messages)
+            return build(messages)
+
+        async def ainvoke(messages):
+            await self.ainvoke(messages)
+            return build(messages)
+
+        return RunnableLambda(invoke, afunc=ainvoke)
+
+
+class FakeEmbeddings(Embeddings):
+    """Local stand-in for OpenAI embeddings: hashed bag-of-words vectors, so texts
+    sharing terms are similar, returned after `latency_seconds` per call.
+    """
+
+    model = "benchmark-fake-embedding"
+
+    def __init__(self, dimensions: int = 256, latency_seconds: float = 0.05):
+        self.dimensions = dimensions
+        self.latency_seconds = latency_seconds
+
+    def vector(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in tokenize(text):
+            digest = hashlib.md5(token.encode()).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] % 2 else -1.0
+        if not vector.any():
+            vector[0] = 1.0
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency_seconds)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        time.sleep(self.latency_seconds)
+        return self.vector(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        await asyncio.sleep(self.latency_seconds)
+        return [self.vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        await asyncio.sleep(self.latency_seconds)
+        return self.vector(text)
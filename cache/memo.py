@@ -0,0 +1,276 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+from langchain_core.embeddings import Embeddings
+from metrics.metrics import timed
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    def as_dict(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def cache_key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+class LRUCache:
+    """Bounded in-memory cache with optional per-entry TTL"""
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or self._expired(entry[0]):
+            self._entries.pop(key, None)
+            self.stats.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value: Any):
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def update(self, key: str, fn: Callable[[Optional[Any]], Optional[Any]]) -> Optional[Any]:
+        """Replace the value with fn(current value, None if missing) in one step;
+        returning None deletes the entry"""
+        value = fn(self.get(key))
+        if value is None:
+            self.delete(key)
+        else:
+            self.set(key, value)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(LRUCache):
+    """LRUCache backed by a SQLite table, so entries survive restarts and are shared
+    between workers. Entries are also kept in memory unless `shared` is set, in which
+    case every read goes to SQLite and sees the other workers' writes"""
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str,
+        max_entries: int = 4096,
+        ttl_seconds: Optional[float] = None,
+        shared: bool = False,
+    ):
+        super().__init__(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.namespace = namespace
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS memo (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def _read(self, key: str) -> Optional[Any]:
+        row = self._conn.execute(
+            "SELECT value, created_at FROM memo WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        if row is None or self._expired(row[1]):
+            return None
+        return json.loads(row[0])
+
+    def _write(self, key: str, value: Any):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO memo VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(value), now, now),
+        )
+        self._conn.execute(
+            """
+            DELETE FROM memo WHERE namespace = ? AND key IN (
+                SELECT key FROM memo WHERE namespace = ?
+                ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.namespace, self.namespace, self.max_entries),
+        )
+
+    def _remove(self, key: str):
+        self._conn.execute(
+            "DELETE FROM memo WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.shared:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry[0]):
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return entry[1]
+
+        with self._lock:
+            value = self._read(key)
+            if value is not None:
+                self._conn.execute(
+                    "UPDATE memo SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (time.time(), self.namespace, key),
+                )
+                self._conn.commit()
+
+        if value is None:
+            self._entries.pop(key, None)
+            self.stats.misses += 1
+            return None
+
+        if not self.shared:
+            super().set(key, value)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        if not self.shared:
+            super().set(key, value)
+        with self._lock:
+            self._write(key, value)
+            self._conn.commit()
+
+    def delete(self, key: str):
+        super().delete(key)
+        with self._lock:
+            self._remove(key)
+            self._conn.commit()
+
+    def update(self, key: str, fn: Callable[[Optional[Any]], Optional[Any]]) -> Optional[Any]:
+        # BEGIN IMMEDIATE takes the database write lock before the read, so workers
+        # updating the same key run one after the other instead of overwriting
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = fn(self._read(key))
+                if value is None:
+                    self._remove(key)
+                else:
+                    self._write(key, value)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+        if value is None:
+            super().delete(key)
+        elif not self.shared:
+            super().set(key, value)
+        return value
+
+
+def make_cache(
+    namespace: str,
+    max_entries: int,
+    path: Optional[str] = None,
+    ttl_seconds: Optional[float] = None,
+    shared: bool = False,
+) -> LRUCache:
+    if path:
+        return SQLiteCache(
+            path,
+            namespace,
+            max_entries=max_entries,
+            ttl_seconds=ttl_seconds,
+            shared=shared,
+        )
+    return LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+
+class CachedEmbeddings(Embeddings):
+    """Memoizes query embeddings; document embeddings are already persisted by the index"""
+
+    def __init__(self, embedding: Embeddings, cache: LRUCache):
+        self.embedding = embedding
+        self.cache = cache
+        self.model = (
+            getattr(embedding, "model", type(embedding).__name__),
+            getattr(embedding, "dimensions", None),
+        )
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with timed("rag_embedding_seconds", "embed_documents", operation="documents"):
+            return self.embedding.embed_documents(texts)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        with timed("rag_embedding_seconds", "embed_documents", operation="documents"):
+            return await self.embedding.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        key = cache_key(self.model, text)
+        vector = self.cache.get(key)
+        if vector is None:
+            with timed("rag_embedding_seconds", "embed_query", operation="query"):
+                vector = self.embedding.embed_query(text)
+            self.cache.set(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = cache_key(self.model, text)
+        vector = self.cache.get(key)
+        if vector is None:
+            with timed("rag_embedding_seconds", "embed_query", operation="query"):
+                vector = await self.embedding.aembed_query(text)
+            self.cache.set(key, vector)
+        return vector
+
+
+class CachedSearch:
+    """Memoizes search results by backend and query in front of a SearchClient"""
+
+    def __init__(self, client, cache: LRUCache):
+        self.client = client
+        self.cache = cache
+        self.backend = type(client.backend).__name__
+
+    async def search(self, query: str) -> list[dict]:
+        key = cache_key(self.backend, query)
+        results = self.cache.get(key)
+        if results is None:
+            results = await self.client.search(query)
+            self.cache.set(key, results)
+        return results
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,135 @@
+import re
+import time
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from langchain_core.embeddings import Embeddings
+from cache.memo import CacheStats
+
+
+@dataclass
+class CacheEntry:
+    embedding: np.ndarray
+    corpus_version: str
+    generation: str
+    created_at: float
+
+
+@dataclass
+class CacheLookup:
+    key: str
+    corpus_version: str
+    embedding: Optional[np.ndarray] = None
+    generation: Optional[str] = None
+
+
+class ResponseCache:
+    """Answers keyed by normalized question, matched exactly first and then by embedding similarity"""
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        max_entries: int = 1024,
+        ttl_seconds: float = 86400,
+        similarity_threshold: float = 0.97,
+    ):
+        self.embedding = embedding
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.stats = CacheStats()
+
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list[str] = []
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        question = re.sub(r"\s+", " ", question.lower()).strip()
+        return question.rstrip("?.!").strip()
+
+    def _key(self, question: str) -> str:
+        return hashlib.sha256(self.normalize(question).encode()).hexdigest()
+
+    def _evict_stale(self, corpus_version: str):
+        """Drop entries past their TTL or answered against another corpus version"""
+        now = time.time()
+        stale = [
+            key
+            for key, entry in self._entries.items()
+            if now - entry.created_at > self.ttl_seconds
+            or entry.corpus_version != corpus_version
+        ]
+        for key in stale:
+            del self._entries[key]
+        if stale:
+            self._matrix = None
+
+    def _hit(self, key: str, lookup: CacheLookup) -> Optional[CacheLookup]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        self._entries.move_to_end(key)
+        lookup.generation = entry.generation
+        return lookup
+
+    def _most_similar(self, embedding: np.ndarray) -> Optional[str]:
+        if not self._entries:
+            return None
+
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries)
+            self._matrix = np.vstack(
+                [self._entries[key].embedding for key in self._matrix_keys]
+            )
+
+        scores = self._matrix @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return self._matrix_keys[best]
+
+    async def alookup(self, question: str, corpus_version: str) -> CacheLookup:
+        self._evict_stale(corpus_version)
+        lookup = CacheLookup(key=self._key(question), corpus_version=corpus_version)
+
+        if self._hit(lookup.key, lookup):
+            self.stats.hits += 1
+            return lookup
+
+        vector = np.asarray(
+            await self.embedding.aembed_query(self.normalize(question)),
+            dtype=np.float32,
+        )
+        lookup.embedding = vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+        similar = self._most_similar(lookup.embedding)
+        if similar is not None and self._hit(similar, lookup):
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+
+        return lookup
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def store(self, lookup: CacheLookup, generation: str):
+        if lookup.embedding is None:
+            return
+
+        self._entries[lookup.key] = CacheEntry(
+            embedding=lookup.embedding,
+            corpus_version=lookup.corpus_version,
+            generation=generation,
+            created_at=time.time(),
+        )
+        self._entries.move_to_end(lookup.key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        self._matrix = None
@@ -0,0 +1,160 @@
+import os
+from pydantic import BaseModel, field_validator, model_validator
+from typing import Literal, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class Settings(BaseModel):
+    model_name: str = "gpt-4.1-mini"
+    temperature: float = 0.2
+    embedding_model: str = "text-embedding-3-large"
+    # Shorten text-embedding-3 vectors via the model's `dimensions` parameter
+    embedding_dimensions: Optional[int] = None
+    pdf_directory: str = "./paper"
+    index_directory: str = "./index"
+    # Token counting for chunking, batching and the context budget: "tiktoken" downloads
+    # the BPE files on first use (set TIKTOKEN_CACHE_DIR to keep them), "words" counts
+    # words and punctuation locally, for runs without network access
+    tokenizer: Literal["tiktoken", "words"] = "tiktoken"
+    chunk_size: int = 1000
+    chunk_overlap: int = 200
+    # Embed and search CHILD_CHUNK_SIZE-token pieces of each chunk, but answer from the
+    # whole chunk they came from (0 or empty to embed the chunks themselves)
+    child_chunk_size: Optional[int] = 300
+    child_chunk_overlap: int = 0
+    top_k: int = 4
+    # "hybrid" fuses BM25 keyword matches with dense results (reciprocal rank fusion
+    # over HYBRID_CANDIDATES chunks from each); "dense" uses embeddings only
+    retrieval_mode: Literal["dense", "hybrid"] = "hybrid"
+    hybrid_candidates: int = 20
+    rrf_k: int = 60
+    # Route on the best retrieval similarity alone when it is at least RELEVANCE_ACCEPT_SIMILARITY
+    # (answer from the PDFs) or below RELEVANCE_REJECT_SIMILARITY (web search); only
+    # results in between are sent to the LLM reviewer
+    relevance_gate_enabled: bool = True
+    relevance_accept_similarity: float = 0.55
+    relevance_reject_similarity: float = 0.25
+    # Prompt context: documents are ranked by retrieval score (web snippets by overlap
+    # with the question), chunks whose word 3-grams mostly repeat already chosen ones
+    # are dropped, and the rest is cut at CONTEXT_BUDGET_TOKENS; CONTEXT_TRIM_SENTENCES
+    # keeps only matching sentences
+    context_budget_tokens: int = 4000
+    context_dedup_threshold: float = 0.8
+    context_trim_sentences: bool = False
+    # "brute_force" scans every vector; "ivf" only scans the IVF_NPROBE nearest clusters
+    vector_index: Literal["brute_force", "ivf"] = "brute_force"
+    ivf_nlist: Optional[int] = None
+    ivf_nprobe: int = 8
+    # Embeddings are memory-mapped from ./index; "float16"/"int8" scan compact codes
+    # and re-rank the best RERANK_CANDIDATES rows with the exact float32 vectors
+    vector_precision: Literal["float32", "float16", "int8"] = "float32"
+    rerank_candidates: int = 50
+    # Ingestion: processes parsing PDFs (defaults to the CPU count) and embedding requests in flight
+    ingest_workers: Optional[int] = None
+    ingest_concurrency: int = 4
+    # Poll PDF_DIRECTORY for added, changed or deleted PDFs (0 disables the watcher)
+    watch_interval_seconds: float = 30
+    # Skip the full answer generation when the best retrieved chunk scores at least
+    # FAST_PATH_SIMILARITY: "model" asks FAST_PATH_MODEL_NAME for a short answer (at most
+    # FAST_PATH_MAX_TOKENS) from the top FAST_PATH_DOCUMENTS, "extractive" quotes up to
+    # FAST_PATH_SENTENCES matching sentences with their source file
+    fast_path_mode: Literal["off", "model", "extractive"] = "off"
+    fast_path_similarity: float = 0.7
+    fast_path_model_name: str = "gpt-4.1-nano"
+    fast_path_max_tokens: int = 256
+    fast_path_documents: int = 2
+    fast_path_sentences: int = 3
+    # Make a first embedding and LLM call at startup, before /readyz reports ready
+    warm_up_enabled: bool = True
+    # /admin endpoints are disabled unless set, and require a matching X-Admin-Token header
+    admin_token: Optional[str] = None
+    # "per_step" routes and extracts keywords in separate calls, "fused" does both in one
+    planner_mode: Literal["per_step", "fused"] = "per_step"
+    response_cache_enabled: bool = True
+    response_cache_size: int = 1024
+    response_cache_ttl_seconds: float = 86400
+    response_cache_similarity: float = 0.97
+    # Memoization of query embeddings, keyword extraction and web search results;
+    # set MEMO_CACHE_PATH to a SQLite file to persist them across restarts
+    memo_cache_size: int = 4096
+    memo_cache_path: Optional[str] = None
+    search_cache_ttl_seconds: float = 3600
+    # Chat sessions, evicted after SESSION_TTL_SECONDS without a turn (SESSION_STORE_PATH
+    # is a SQLite file to keep them across restarts); beyond SESSION_HISTORY_TOKENS all
+    # but the last SESSION_RECENT_TURNS turns are folded into a summary
+    session_max_sessions: int = 10000
+    session_ttl_seconds: float = 86400
+    session_store_path: Optional[str] = None
+    session_history_tokens: int = 2000
+    session_recent_turns: int = 2
+    # Extract keywords and retrieve while the router runs, discarding on "generation"
+    # (per_step planner only)
+    speculative_research: bool = False
+    # Start the web search together with retrieval and keep its results only when the
+    # documents are judged not relevant; each source gets its own timeout (not
+    # combinable with SPECULATIVE_RESEARCH)
+    concurrent_web_search: bool = False
+    retrieval_timeout_seconds: float = 10
+    web_search_timeout_seconds: float = 8
+    # Web search: "brave" needs BRAVE_SEARCH_API_KEY; "stub" answers offline, from
+    # SEARCH_STUB_PATH ({query: [{"title", "link", "snippet"}]}) when set
+    search_backend: Literal["brave", "stub"] = "brave"
+    search_stub_path: Optional[str] = None
+    search_results: int = 5
+    # Token bucket shared by all requests (Brave's free plan allows 1 request/s)
+    search_rate_per_second: float = 1.0
+    search_burst: int = 1
+    search_max_retries: int = 3
+    search_max_connections: int = 10
+    # Concurrent query embeddings within EMBEDDING_BATCH_WINDOW_MS share one request
+    # of up to EMBEDDING_BATCH_SIZE texts (0 disables batching)
+    embedding_batch_window_ms: float = 10
+    embedding_batch_size: int = 64
+    # Upstream calls in flight per process, whether or not embeddings are batched;
+    # further calls wait for a free slot
+    max_concurrent_llm_calls: int = 16
+    max_concurrent_embedding_calls: int = 8
+    # Questions answered at once; up to ADMISSION_MAX_QUEUE more wait at most
+    # ADMISSION_QUEUE_TIMEOUT_SECONDS, the rest get a 503 with Retry-After
+    admission_max_in_flight: int = 32
+    admission_max_queue: int = 64
+    admission_queue_timeout_seconds: float = 10
+    admission_retry_after_seconds: int = 2
+
+    @field_validator("child_chunk_size", mode="before")
+    @classmethod
+    def disable_child_chunks(cls, value):
+        if value in (0, "0", "", "none", "None", "null"):
+            return None
+        return value
+
+    @field_validator("search_rate_per_second", "search_burst")
+    @classmethod
+    def check_search_rate(cls, value, info):
+        # The token bucket divides by the rate and never refills past the burst
+        if value <= 0:
+            raise ValueError(f"{info.field_name.upper()} must be greater than 0")
+        return value
+
+    @model_validator(mode="after")
+    def check_workflow_options(self) -> "Settings":
+        # Each of these selects its own workflow, only one of them can be used
+        if self.speculative_research and self.planner_mode == "fused":
+            raise ValueError("SPECULATIVE_RESEARCH requires PLANNER_MODE=per_step")
+        if self.speculative_research and self.concurrent_web_search:
+            raise ValueError(
+                "SPECULATIVE_RESEARCH and CONCURRENT_WEB_SEARCH cannot be combined"
+            )
+        return self
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Build settings from environment variables named after each field (e.g. MODEL_NAME)"""
+        values = {
+            name: os.environ[name.upper()]
+            for name in cls.model_fields
+            if name.upper() in os.environ
+        }
+        return cls(**values)
@@ -0,0 +1,194 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+from tokenizer.tokenizer import Tokenizer, encoding_for_model
+from vector_store.lexical import tokenize
+
+WORD_PATTERN = re.compile(r"\w+")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+SHINGLE_SIZE = 3
+
+
+@dataclass
+class Context:
+    documents: list[str]
+    tokens: int
+    dropped_duplicates: int
+    dropped_over_budget: int
+    trimmed_overlaps: int = 0
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[tuple[str, ...]]:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def trim_overlap(text: str, seen: set[tuple[str, ...]], min_words: int) -> str:
+    """Cut the words at the start and end of `text` that repeat already chosen text,
+    as the splitter's overlap between neighbouring chunks does; runs shorter than
+    `min_words` are kept. Returns "" when nothing new is left.
+    """
+    words = list(WORD_PATTERN.finditer(text))
+    keys = [word.group().lower() for word in words]
+    covered = [
+        tuple(keys[i : i + SHINGLE_SIZE]) in seen
+        for i in range(len(keys) - SHINGLE_SIZE + 1)
+    ]
+
+    leading = 0
+    while leading < len(covered) and covered[leading]:
+        leading += 1
+    trailing = 0
+    while trailing < len(covered) - leading and covered[-1 - trailing]:
+        trailing += 1
+
+    # A run of n repeated shingles spans n + SHINGLE_SIZE - 1 words
+    start = leading + SHINGLE_SIZE - 1 if leading else 0
+    end = len(words) - (trailing + SHINGLE_SIZE - 1) if trailing else len(words)
+    if start < min_words:
+        start = 0
+    if len(words) - end < min_words:
+        end = len(words)
+    if start >= end:
+        return ""
+    if start == 0 and end == len(words):
+        return text
+
+    begin = words[start].start() if start else 0
+    finish = words[end].start() if end < len(words) else len(text)
+    return text[begin:finish].strip()
+
+
+class ContextBuilder:
+    """Assemble the documents sent to the LLM: rank them by retrieval score (web
+    snippets, which have none, follow by overlap with the question), drop chunks
+    that mostly repeat ones already chosen and cut the shared span off chunks that
+    only partly do (the splitter's overlap between neighbours), optionally keep only
+    the sentences that mention the question, and stop at a token budget.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "gpt-4.1-mini",
+        budget_tokens: int = 4000,
+        dedup_threshold: float = 0.8,
+        trim_sentences: bool = False,
+        tokenizer: Tokenizer = "tiktoken",
+        min_overlap_words: int = 8,
+    ):
+        self.encoding = encoding_for_model(model_name, tokenizer)
+        self.budget_tokens = budget_tokens
+        self.dedup_threshold = dedup_threshold
+        self.trim_sentences = trim_sentences
+        self.min_overlap_words = min_overlap_words
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    @staticmethod
+    def relevance(question_terms: set[str], text: str) -> float:
+        if not question_terms:
+            return 0.0
+        return len(question_terms & set(tokenize(text))) / len(question_terms)
+
+    def trim(self, question_terms: set[str], text: str) -> str:
+        """Keep the sentences sharing a term with the question, in their original order"""
+        sentences = SENTENCE_PATTERN.split(text.strip())
+        kept = [s for s in sentences if question_terms & set(tokenize(s))]
+        return " ".join(kept) if kept else text
+
+    def extract(
+        self,
+        question: str,
+        text: str,
+        max_sentences: int = 3,
+        min_relevance: float = 0.5,
+    ) -> Optional[str]:
+        """The sentences of `text` sharing the most terms with the question, in their
+        original order; None when none shares at least `min_relevance` of them"""
+        question_terms = set(tokenize(question))
+        sentences = [" ".join(s.split()) for s in SENTENCE_PATTERN.split(text.strip())]
+        scored = [
+            (self.relevance(question_terms, sentence), i)
+            for i, sentence in enumerate(sentences)
+        ]
+        best = sorted(
+            (item for item in scored if item[0] >= min_relevance),
+            key=lambda item: -item[0],
+        )[:max_sentences]
+        if not best:
+            return None
+        return " ".join(sentences[i] for _, i in sorted(best, key=lambda item: item[1]))
+
+    def build(
+        self,
+        question: str,
+        documents: list[str],
+        scores: Optional[list[Optional[float]]] = None,
+    ) -> Context:
+        """`scores` holds the retrieval score of the leading documents, in the same
+        order; the others are ranked after them by overlap with the question"""
+        question_terms = set(tokenize(question))
+        scores = scores or []
+
+        def order(item: tuple[str, Optional[float]]) -> tuple[int, float]:
+            text, score = item
+            if score is None:
+                return (1, -self.relevance(question_terms, text))
+            return (0, -score)
+
+        # Stable sort: equally scored documents keep their retrieval order
+        ranked = [
+            text
+            for text, _ in sorted(
+                (
+                    (text.strip(), scores[i] if i < len(scores) else None)
+                    for i, text in enumerate(documents)
+                    if text and text.strip()
+                ),
+                key=order,
+            )
+        ]
+
+        selected: list[str] = []
+        seen: set[tuple[str, ...]] = set()
+        used = duplicates = over_budget = overlaps = 0
+
+        for text in ranked:
+            text_shingles = shingles(text)
+            if text_shingles:
+                repeated = len(text_shingles & seen) / len(text_shingles)
+                if repeated >= self.dedup_threshold:
+                    duplicates += 1
+                    continue
+                if repeated:
+                    trimmed = trim_overlap(text, seen, self.min_overlap_words)
+                    if not trimmed:
+                        duplicates += 1
+                        continue
+                    if trimmed != text:
+                        overlaps += 1
+                        text = trimmed
+
+            if self.trim_sentences:
+                text = self.trim(question_terms, text)
+
+            tokens = self.count_tokens(text)
+            if used + tokens > self.budget_tokens:
+                remaining = self.budget_tokens - used
+                if selected or remaining <= 0:
+                    over_budget += 1
+                    continue
+                # Never send an empty context because the best document is too long
+                text = self.encoding.decode(
+                    self.encoding.encode(text, disallowed_special=())[:remaining]
+                )
+                tokens = remaining
+
+            selected.append(text)
+            seen |= text_shingles
+            used += tokens
+
+        return Context(selected, used, duplicates, over_budget, overlaps)
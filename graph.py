@@ -1,131 +1,486 @@
-import json
+import asyncio
+import os
+import sys
 import typer
 from rich import print
-from typing import Optional
+from typing import Optional, TYPE_CHECKING, Annotated, AsyncIterator
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph
-from langchain_community.tools import BraveSearch
+from langgraph.config import get_stream_writer
 from langchain_core.messages import BaseMessage
+from metrics.metrics import instrument_node, metrics
 from typing import List
-from llm import LLMProcessor
-from vector_store.vector_store import PDFVectorStore
+
+if TYPE_CHECKING:
+    from resources import AppResources
 
 
 class GraphState(TypedDict):
     question: str
     chat_history: List[BaseMessage]
     generation: Optional[str]
+    route: Optional[str]
     keyword: str
     web_search: Optional[str]
     documents: List[str]
+    # Source file of each retrieved document, in the same order as `documents`
+    sources: List[Optional[str]]
+    # Retrieval similarity of each retrieved document, in the same order as `sources`;
+    # web snippets appended to `documents` have none
+    scores: List[Optional[float]]
+    # Best cosine similarity among the retrieved chunks, used by the relevance gate
+    relevance: Optional[float]
+    # How the answer was produced: "full", "fast" or "extractive"
+    answer_path: Optional[str]
+
+
+def initial_state(
+    question: str, chat_history: Optional[List[BaseMessage]] = None
+) -> GraphState:
+    return {
+        "question": question,
+        "chat_history": chat_history or [],
+        "generation": None,
+        "route": None,
+        "keyword": "",
+        "web_search": None,
+        "documents": [],
+        "sources": [],
+        "scores": [],
+        "relevance": None,
+        "answer_path": None,
+    }
 
 
 ### Nodes
-def routing_conversation(state):
+async def routing_conversation(state, resources: "AppResources"):
     print("---ROUTING CONVERSATION---")
-    router = LLMProcessor()
     question = state["question"]
     chat = state["chat_history"]
-    return router.route_conversation(chat, question)
+
+    route = await resources.llm.aroute_conversation(chat, question)
+    get_stream_writer()({"event": "route", "route": route})
+    return route
 
 
-def generate_keyword(state):
+async def generate_keyword(state, resources: "AppResources"):
     print("---GENERATE KEYWORD---")
-    extractor = LLMProcessor()
     question = state["question"]
 
-    keyword = extractor.extract_keyword(question)
+    keyword = await resources.llm.aextract_keyword(question)
+    get_stream_writer()({"event": "keyword", "keyword": keyword})
     return {"keyword": keyword}
 
 
-def retriever(state):
+async def retriever(state, resources: "AppResources"):
     print("---RETRIEVE DOCUMENTS---")
-    vector_store = PDFVectorStore()
     keyword = state["keyword"]
 
-    results = vector_store.retrieve_doc(question=keyword)
+    results = await resources.vector_store.aretrieve_doc(question=keyword)
     documents = state["documents"]
+    sources = state["sources"]
+    scores = state["scores"]
 
     for doc in results:
         documents.append(doc.page_content)
+        sources.append(doc.metadata.get("source"))
+        scores.append(doc.metadata.get("similarity"))
 
-    return {"documents": documents}
+    similarities = [doc.metadata.get("similarity") for doc in results]
+    similarities = [similarity for similarity in similarities if similarity is not None]
+    relevance = max(similarities) if similarities else None
 
+    get_stream_writer()(
+        {"event": "retrieval", "documents": len(results), "relevance": relevance}
+    )
+    return {
+        "documents": documents,
+        "sources": sources,
+        "scores": scores,
+        "relevance": relevance,
+    }
 
-def review_documents(state):
+
+def gate_relevance(relevance: Optional[float], settings) -> Optional[str]:
+    """Decide from the retrieval similarity alone; None when it falls in the ambiguous band"""
+    if not settings.relevance_gate_enabled or relevance is None:
+        return None
+    if relevance >= settings.relevance_accept_similarity:
+        return "relevant"
+    if relevance < settings.relevance_reject_similarity:
+        return "not_relevant"
+    return None
+
+
+async def review_documents(state, resources: "AppResources"):
     print("---REVIEW DOCUMENTS---")
-    reviewer = LLMProcessor()
     question = state["question"]
     documents = state["documents"]
 
+    reviewer = "similarity"
     if len(documents) == 0:
-        return "not_relevant"
+        relevancy = "not_relevant"
+    else:
+        relevancy = gate_relevance(state.get("relevance"), resources.settings)
+        if relevancy is None:
+            reviewer = "llm"
+            context = resources.context.build(question, documents, state["scores"])
+            relevancy = await resources.llm.areview_documents(
+                context.documents, question
+            )
+
+    get_stream_writer()({"event": "review", "relevancy": relevancy, "reviewer": reviewer})
+    return relevancy
 
-    return reviewer.review_documents(documents, question)
 
+async def search_web(keyword: str, resources: "AppResources") -> list[str]:
+    results = await resources.search.search(keyword)
+    return [result["snippet"] for result in results]
 
-def web_search(state):
+
+async def web_search(state, resources: "AppResources"):
     print("---WEB SEARCH---")
     keyword = state["keyword"]
-    search = BraveSearch()
 
-    results = json.loads(search.run(keyword))
+    results = await search_web(keyword, resources)
     documents = state["documents"]
+    documents.extend(results)
 
-    for result in results:
-        documents.append(result["snippet"])
+    get_stream_writer()({"event": "web_search", "documents": len(results)})
+    return {"documents": documents, "web_search": "yes"}
 
-    return {"documents": documents}
 
+async def concurrent_research(state, resources: "AppResources"):
+    """Retrieve, review and web search at once; web results are only waited for
+    when the retrieved documents are judged not relevant.
+    """
+    print("---CONCURRENT RESEARCH---")
+    settings = resources.settings
+    keyword = state["keyword"]
 
-def generation(state):
-    print("---RESEARCH GENERATION---")
-    processor = LLMProcessor()
+    web_task = asyncio.create_task(
+        asyncio.wait_for(
+            search_web(keyword, resources), settings.web_search_timeout_seconds
+        )
+    )
 
+    try:
+        try:
+            update = await asyncio.wait_for(
+                retriever(state, resources), settings.retrieval_timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            print("Retrieval timed out")
+            update = {"documents": [], "sources": [], "scores": [], "relevance": None}
+        except Exception as e:
+            print(f"Error retrieving documents: {e}")
+            update = {"documents": [], "sources": [], "scores": [], "relevance": None}
+
+        relevancy = await review_documents({**state, **update}, resources)
+        if relevancy == "relevant":
+            return update
+
+        try:
+            results = await web_task
+        except asyncio.TimeoutError:
+            print("Web search timed out")
+            results = []
+        except Exception as e:
+            print(f"Error searching the web: {e}")
+            results = []
+    finally:
+        # No-op once the search finished; otherwise nobody is left to await it
+        web_task.cancel()
+
+    get_stream_writer()({"event": "web_search", "documents": len(results)})
+    return {**update, "documents": update["documents"] + results, "web_search": "yes"}
+
+
+async def plan_research(state, resources: "AppResources"):
+    print("---PLAN RESEARCH---")
     question = state["question"]
-    documents = state["documents"]
-    chat_history = state["chat_history"]
+    chat = state["chat_history"]
 
-    generation = processor.generate_answer(documents, question, chat_history)
-    return {"generation": generation}
+    plan = await resources.llm.aplan_research(chat, question)
+    route = getattr(plan, "route", None)
+    keyword = getattr(plan, "search_keyword", "")
 
+    get_stream_writer()({"event": "route", "route": route})
+    if route == "research":
+        get_stream_writer()({"event": "keyword", "keyword": keyword})
+
+    return {"route": route, "keyword": keyword}
+
+
+def planned_route(state):
+    return state["route"]
+
+
+async def speculative_research(state, resources: "AppResources"):
+    """Route while keyword extraction and retrieval already run; drop them if not needed"""
+    print("---SPECULATIVE RESEARCH---")
+
+    async def prefetch():
+        update = await generate_keyword(state, resources)
+        # Retrieve into fresh lists so a discarded prefetch never touches the state
+        retrieved = await retriever(
+            {**state, **update, "documents": [], "sources": [], "scores": []}, resources
+        )
+        return update["keyword"], retrieved
+
+    prefetch_task = asyncio.create_task(prefetch())
+    route = await routing_conversation(state, resources)
+
+    if route != "research":
+        prefetch_task.cancel()
+        return {"route": route}
+
+    keyword, retrieved = await prefetch_task
+    return {
+        "route": route,
+        "keyword": keyword,
+        "documents": state["documents"] + retrieved["documents"],
+        "sources": state["sources"] + retrieved["sources"],
+        "scores": state["scores"] + retrieved["scores"],
+        "relevance": retrieved["relevance"],
+    }
 
-def create_workflow():
-    workflow = StateGraph(GraphState)
 
-    workflow.add_node("generate_keyword", generate_keyword)
-    workflow.add_node("retriever", retriever)
-    workflow.add_node("review_documents", review_documents)
-    workflow.add_node("generation", generation)
-    workflow.add_node("web_search", web_search)
+async def review_speculative_research(state, resources: "AppResources"):
+    if state["route"] != "research":
+        return state["route"]
 
-    workflow.set_conditional_entry_point(
-        routing_conversation, {"research": "generate_keyword", "generation": "generation"}
+    return await review_documents(state, resources)
+
+
+def choose_answer_path(state, settings) -> str:
+    """"fast" or "extractive" when retrieval alone clearly answers the question, else "full" """
+    relevance = state.get("relevance")
+    if (
+        settings.fast_path_mode == "off"
+        or relevance is None
+        or relevance < settings.fast_path_similarity
+        or state.get("web_search")
+    ):
+        return "full"
+    return "fast" if settings.fast_path_mode == "model" else "extractive"
+
+
+def extractive_answer(state, resources: "AppResources") -> Optional[str]:
+    """Quote the best matching sentences of the top retrieved documents with their source"""
+    settings = resources.settings
+    retrieved = zip(state["documents"], state["sources"], state["scores"])
+    top = sorted(retrieved, key=lambda item: -(item[2] or 0.0))
+    for document, source, _ in top[: settings.fast_path_documents]:
+        quote = resources.context.extract(
+            state["question"], document, max_sentences=settings.fast_path_sentences
+        )
+        if quote is not None:
+            source = os.path.basename(source) if source else "retrieved document"
+            return f"{quote}\n\nSource: {source}"
+    return None
+
+
+async def generation(state, resources: "AppResources"):
+    print("---RESEARCH GENERATION---")
+    question = state["question"]
+    chat_history = state["chat_history"]
+
+    path = choose_answer_path(state, resources.settings)
+    if path == "extractive":
+        generation = extractive_answer(state, resources)
+        if generation is not None:
+            return answered(generation, path)
+        path = "full"
+
+    context = resources.context.build(question, state["documents"], state["scores"])
+    get_stream_writer()(
+        {
+            "event": "context",
+            "documents": len(context.documents),
+            "tokens": context.tokens,
+            "dropped_duplicates": context.dropped_duplicates,
+            "dropped_over_budget": context.dropped_over_budget,
+            "trimmed_overlaps": context.trimmed_overlaps,
+        }
+    )
+
+    if path == "fast":
+        generation = await resources.llm.agenerate_short_answer(
+            context.documents[: resources.settings.fast_path_documents],
+            question,
+            chat_history,
+        )
+        if generation is not None:
+            return answered(generation, path)
+        path = "full"
+
+    generation = await resources.llm.agenerate_answer(
+        context.documents, question, chat_history
     )
-    workflow.add_edge("generate_keyword", "retriever")
+    return answered(generation, path)
+
+
+def answered(generation: str, path: str) -> dict:
+    metrics.inc("rag_answer_path_total", path=path)
+    get_stream_writer()({"event": "answer_path", "path": path})
+    return {"generation": generation, "answer_path": path}
+
+
+def bind(name: str, node, resources: "AppResources"):
+    """Give a node its resources and record its wall time under `name`"""
+
+    async def run(state):
+        return await node(state, resources=resources)
+
+    return instrument_node(name, run)
+
+
+def add_retrieval(workflow: StateGraph, resources: "AppResources"):
+    """Add the "retriever" step, which ends in "generation" via review and web search"""
+    if resources.settings.concurrent_web_search:
+        workflow.add_node(
+            "retriever", bind("concurrent_research", concurrent_research, resources)
+        )
+        workflow.add_edge("retriever", "generation")
+        return
+
+    workflow.add_node("retriever", bind("retriever", retriever, resources))
     workflow.add_conditional_edges(
         "retriever",
-        review_documents,
+        bind("review_documents", review_documents, resources),
         {"relevant": "generation", "not_relevant": "web_search"},
     )
+
+
+def create_workflow(resources: "AppResources"):
+    workflow = StateGraph(GraphState)
+
+    workflow.add_node("generation", bind("generation", generation, resources))
+    workflow.add_node("web_search", bind("web_search", web_search, resources))
+
+    if resources.settings.planner_mode == "fused":
+        workflow.add_node(
+            "plan_research", bind("plan_research", plan_research, resources)
+        )
+        add_retrieval(workflow, resources)
+
+        workflow.set_entry_point("plan_research")
+        workflow.add_conditional_edges(
+            "plan_research",
+            planned_route,
+            {"research": "retriever", "generation": "generation"},
+        )
+    elif resources.settings.speculative_research:
+        workflow.add_node(
+            "speculative_research",
+            bind("speculative_research", speculative_research, resources),
+        )
+        workflow.set_entry_point("speculative_research")
+        workflow.add_conditional_edges(
+            "speculative_research",
+            bind(
+                "review_speculative_research", review_speculative_research, resources
+            ),
+            {
+                "generation": "generation",
+                "relevant": "generation",
+                "not_relevant": "web_search",
+            },
+        )
+    else:
+        workflow.add_node(
+            "generate_keyword", bind("generate_keyword", generate_keyword, resources)
+        )
+        add_retrieval(workflow, resources)
+
+        workflow.set_conditional_entry_point(
+            bind("routing_conversation", routing_conversation, resources),
+            {"research": "generate_keyword", "generation": "generation"},
+        )
+        workflow.add_edge("generate_keyword", "retriever")
+
     workflow.add_edge("web_search", "generation")
 
     graph = workflow.compile()
     return graph
 
-def main(user_input: str):
+
+async def stream_workflow(graph, inputs: GraphState) -> AsyncIterator[tuple[str, dict]]:
+    """Yield (event, data) pairs: node progress as it happens, then answer tokens"""
+    generation = ""
+    streamed = False
+    async for mode, chunk in graph.astream(
+        inputs, stream_mode=["custom", "updates", "messages"]
+    ):
+        if mode == "custom":
+            yield chunk["event"], {k: v for k, v in chunk.items() if k != "event"}
+
+        elif mode == "updates" and "generation" in chunk:
+            generation = chunk["generation"]["generation"]
+
+        elif mode == "messages":
+            message, metadata = chunk
+            if metadata.get("langgraph_node") == "generation" and message.content:
+                streamed = True
+                yield "token", {"content": message.content}
+
+    # Extractive answers are not produced by a model, send them in one piece
+    if generation and not streamed:
+        yield "token", {"content": generation}
+    yield "done", {"generation": generation}
+
+
+async def stream_answer(graph, inputs: GraphState) -> Optional[str]:
+    generation = None
+    async for event, data in stream_workflow(graph, inputs):
+        if event == "token":
+            sys.stdout.write(data["content"])
+            sys.stdout.flush()
+        elif event == "done":
+            sys.stdout.write("\n")
+            generation = data["generation"]
+        else:
+            print(f"[dim]{event}: {data}[/dim]")
+    return generation
+
+
+def main(
+    user_input: str,
+    stream: Annotated[
+        bool, typer.Option(help="Stream progress events and answer tokens")
+    ] = False,
+    session_id: Annotated[
+        Optional[str],
+        typer.Option(help="Continue a conversation (persisted with SESSION_STORE_PATH)"),
+    ] = None,
+):
+    from config import Settings
+    from resources import AppResources
+
     print(f"[bold green]User:[/bold green] {user_input}")
-    inputs: GraphState = {
-        "question": user_input,
-        "chat_history": [],
-        "generation": None,
-        "keyword": "",
-        "web_search": None,
-        "documents": [],
-    }
-    
-    result = create_workflow().invoke(inputs, stream_mode="values")
-    print(f"[bold green]Assistance:[/bold green] {result["generation"]}")
+    resources = AppResources(Settings.from_env())
+
+    chat_history = []
+    if session_id:
+        chat_history = resources.sessions.messages(resources.sessions.load(session_id))
+    inputs = initial_state(user_input, chat_history)
+
+    async def run():
+        if stream:
+            print("[bold green]Assistance:[/bold green]")
+            generation = await stream_answer(resources.graph, inputs)
+        else:
+            result = await resources.graph.ainvoke(inputs, stream_mode="values")
+            generation = result["generation"]
+            print(f"[bold green]Assistance:[/bold green] {generation}")
+
+        if session_id and generation:
+            if resources.sessions.record(session_id, user_input, generation):
+                await resources.sessions.summarize(session_id)
+        await resources.aclose()
+
+    asyncio.run(run())
 
 if __name__ == "__main__":
     typer.run(main)
\ No newline at end of file
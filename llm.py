@@ -1,12 +1,19 @@
+import asyncio
 from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage, BaseMessage
 from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from typing import Optional, Literal, List
+from cache.memo import LRUCache, cache_key
+from metrics.metrics import LLMMetricsCallback
 
 load_dotenv()
 
+ANSWER_ERROR_PREFIX = "I encountered an error while generating the answer"
+
 
 class ConversationRoute(BaseModel):
     route: Literal["generation", "research"]
@@ -16,20 +23,71 @@ class Keyword(BaseModel):
     search_keyword: str
 
 
+class ResearchPlan(BaseModel):
+    route: Literal["generation", "research"]
+    search_keyword: str
+
+
 class DocumentRelevancy(BaseModel):
     relevancy: Literal["relevant", "not_relevant"]
 
 
 class LLMProcessor:
-    def __init__(self, model_name: str = "gpt-4.1-mini", temperature: float = 0.2):
-        self.llm = init_chat_model(
-            model_name, model_provider="openai", temperature=temperature
-        )
+    def __init__(
+        self,
+        model_name: str = "gpt-4.1-mini",
+        temperature: float = 0.2,
+        keyword_cache: Optional[LRUCache] = None,
+        llm: Optional[BaseChatModel] = None,
+        max_concurrency: Optional[int] = None,
+        fast_model_name: Optional[str] = None,
+        fast_max_tokens: int = 256,
+    ):
+        self.model_name = model_name
+        self.keyword_cache = keyword_cache
+        # Async calls beyond `max_concurrency` wait for a free slot
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        if llm is not None:
+            self.llm = llm.model_copy(
+                update={"callbacks": [*(llm.callbacks or []), LLMMetricsCallback(model_name)]}
+            )
+        else:
+            self.llm = init_chat_model(
+                model_name,
+                model_provider="openai",
+                temperature=temperature,
+                # Report token usage on streamed answers too
+                stream_usage=True,
+                callbacks=[LLMMetricsCallback(model_name)],
+            )
+
+        # Smaller model with a short answer budget for questions the PDFs clearly answer
+        self.fast_llm = None
+        if fast_model_name is not None:
+            if llm is not None:
+                fast_llm = llm.model_copy(
+                    update={
+                        "callbacks": [
+                            *(llm.callbacks or []),
+                            LLMMetricsCallback(fast_model_name),
+                        ]
+                    }
+                )
+            else:
+                fast_llm = init_chat_model(
+                    fast_model_name,
+                    model_provider="openai",
+                    temperature=temperature,
+                    stream_usage=True,
+                    callbacks=[LLMMetricsCallback(fast_model_name)],
+                )
+            self.fast_llm = fast_llm.bind(max_tokens=fast_max_tokens)
 
         # Create structured LLM instances for different output types
         self.route_llm = self.llm.with_structured_output(ConversationRoute)
         self.keyword_llm = self.llm.with_structured_output(Keyword)
         self.relevancy_llm = self.llm.with_structured_output(DocumentRelevancy)
+        self.plan_llm = self.llm.with_structured_output(ResearchPlan)
 
         # System prompts for different tasks
         self.prompts = {
@@ -88,6 +146,23 @@ class LLMProcessor:
             
             Extract the most relevant search keywords that will help find documents containing the information needed to answer the user's question.
             """,
+            "planning": """
+            You are the planner for a research assistant that can search a collection of documents and the web.
+            For each user message, decide the route and, when research is needed, the search keywords, in a single step.
+
+            Route:
+            -   **'research'**: the question asks for specific, factual, up-to-date, statistical or source-based information that should be looked up
+                (e.g. results reported in a paper, comparisons that need data, current events, "who/what/when" facts).
+            -   **'generation'**: the message is small talk, a creative task, an opinion or general advice, a broad conceptual explanation,
+                or a request to summarize or rephrase what is already in the chat history.
+            Prefer 'research' whenever the answer should be verified or sourced externally.
+
+            Search keywords (only for 'research', otherwise return an empty string):
+            - Keep the core subject, specific names, technical terms, datasets and qualifiers such as dates or "latest".
+            - Drop filler words (the, and, how, what, why).
+            - Use 2-6 key terms, e.g. "What are the benefits of exercise for mental health?" → "exercise benefits mental health".
+            - Resolve references to earlier turns so the keywords stand on their own.
+            """,
             "document_review": """
             You are an expert document relevance assessor tasked with determining whether provided documents contain sufficient information to answer a user's question.
             
@@ -137,33 +212,208 @@ class LLMProcessor:
             
             Based on the provided documents, answer the user's question thoroughly and accurately.
             """,
+            "short_answer": """
+            You are a research assistant answering a factual question from the provided documents.
+
+            **Instructions:**
+            1. Answer in one to three sentences, starting with the answer itself.
+            2. Use only information stated in the documents and name the document it comes from (e.g. "Document 1").
+            3. If the documents do not contain the answer, say so in one sentence.
+
+            Available Context Documents:
+            {context_documents}
+            """,
+            "conversation_summary": """
+            You maintain a running summary of a conversation between a user and an assistant that answers questions about research papers.
+
+            **Instructions:**
+            1. Merge the existing summary with the new conversation turns into one updated summary.
+            2. Keep the topics, papers, datasets, names and figures that were discussed, and any conclusions reached.
+            3. Keep what the user wants to know and any preferences they stated.
+            4. Drop greetings, filler and repeated content.
+            5. Write concise prose of at most a few short paragraphs.
+
+            Existing summary:
+            {summary}
+            """,
         }
 
+    def _routing_messages(
+        self, existing_conversation: list[BaseMessage], user_input: str
+    ) -> List[BaseMessage]:
+        return [
+            SystemMessage(content=self.prompts["routing"]),
+            *existing_conversation,  # Spread the existing conversation
+            HumanMessage(content=user_input),
+        ]
+
+    def _planning_messages(
+        self, existing_conversation: list[BaseMessage], user_input: str
+    ) -> List[BaseMessage]:
+        return [
+            SystemMessage(content=self.prompts["planning"]),
+            *existing_conversation,
+            HumanMessage(content=user_input),
+        ]
+
+    def _keyword_messages(self, user_input: str) -> List[BaseMessage]:
+        return [
+            SystemMessage(content=self.prompts["keyword_extraction"]),
+            HumanMessage(content=user_input),
+        ]
+
+    def _summary_messages(
+        self, summary: str, turns: list[tuple[str, str]]
+    ) -> List[BaseMessage]:
+        transcript = "\n\n".join(
+            f"User: {question}\nAssistant: {answer}" for question, answer in turns
+        )
+        return [
+            SystemMessage(
+                content=self.prompts["conversation_summary"].format(
+                    summary=summary or "(none)"
+                )
+            ),
+            HumanMessage(content=f"New conversation turns:\n\n{transcript}"),
+        ]
+
+    def _review_messages(
+        self, docs: list[Document], user_input: str
+    ) -> List[BaseMessage]:
+        # Create documents text for the prompt
+        documents_text = ""
+        for i, doc in enumerate(docs, 1):
+            documents_text += f"Document {i}:\n{doc}\n\n"
+
+        system_prompt = self.prompts["document_review"].format(
+            documents_text=documents_text
+        )
+
+        return [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=f"User question: {user_input}"),
+        ]
+
+    def _answer_messages(
+        self,
+        documents: List[str],
+        user_question: str,
+        chat_history: List[BaseMessage],
+        prompt: str = "answer_generation",
+    ) -> List[BaseMessage]:
+        context_documents = ""
+        for i, doc in enumerate(documents, 1):
+            context_documents += f"Document {i}:\n{doc.strip()}\n\n"
+
+        system_prompt = self.prompts[prompt].format(
+            context_documents=context_documents
+        )
+
+        conversation: List[BaseMessage] = [SystemMessage(content=system_prompt)]
+
+        if chat_history:
+            conversation.extend(chat_history)
+
+        conversation.append(HumanMessage(content=user_question))
+        return conversation
+
+    async def _ainvoke(self, runnable: Runnable, conversation: List[BaseMessage]):
+        if self.semaphore is None:
+            return await runnable.ainvoke(conversation)
+        async with self.semaphore:
+            return await runnable.ainvoke(conversation)
+
+    @staticmethod
+    def _response_text(response) -> str:
+        if hasattr(response, "content"):
+            return response.content
+        else:
+            return str(response)
+
     def route_conversation(
         self, existing_conversation: list[BaseMessage], user_input: str
     ) -> Optional[str]:
         """Route conversation based on existing context and user input"""
         try:
-            conversation = [
-                SystemMessage(content=self.prompts["routing"]),
-                *existing_conversation,  # Spread the existing conversation
-                HumanMessage(content=user_input),
-            ]
+            conversation = self._routing_messages(existing_conversation, user_input)
             result = self.route_llm.invoke(conversation)
             return getattr(result, "route", None)
         except Exception as e:
             print(f"Error routing conversation: {e}")
             return None
 
+    async def aroute_conversation(
+        self, existing_conversation: list[BaseMessage], user_input: str
+    ) -> Optional[str]:
+        """Async version of route_conversation"""
+        try:
+            conversation = self._routing_messages(existing_conversation, user_input)
+            result = await self._ainvoke(self.route_llm, conversation)
+            return getattr(result, "route", None)
+        except Exception as e:
+            print(f"Error routing conversation: {e}")
+            return None
+
+    def plan_research(
+        self, existing_conversation: list[BaseMessage], user_input: str
+    ) -> Optional[ResearchPlan]:
+        """Decide the route and search keywords in a single call"""
+        try:
+            conversation = self._planning_messages(existing_conversation, user_input)
+            return self.plan_llm.invoke(conversation)
+        except Exception as e:
+            print(f"Error planning research: {e}")
+            return None
+
+    async def aplan_research(
+        self, existing_conversation: list[BaseMessage], user_input: str
+    ) -> Optional[ResearchPlan]:
+        """Async version of plan_research"""
+        try:
+            conversation = self._planning_messages(existing_conversation, user_input)
+            return await self._ainvoke(self.plan_llm, conversation)
+        except Exception as e:
+            print(f"Error planning research: {e}")
+            return None
+
+    def _cached_keyword(self, user_input: str) -> tuple[str, Optional[str]]:
+        key = cache_key(self.model_name, user_input)
+        if self.keyword_cache is None:
+            return key, None
+        return key, self.keyword_cache.get(key)
+
+    def _store_keyword(self, key: str, keyword: Optional[str]):
+        if self.keyword_cache is not None and keyword:
+            self.keyword_cache.set(key, keyword)
+
     def extract_keyword(self, user_input: str) -> Optional[str]:
         """Extract search keywords from user input"""
+        key, keyword = self._cached_keyword(user_input)
+        if keyword is not None:
+            return keyword
+
         try:
-            conversation = [
-                SystemMessage(content=self.prompts["keyword_extraction"]),
-                HumanMessage(content=user_input),
-            ]
+            conversation = self._keyword_messages(user_input)
             result = self.keyword_llm.invoke(conversation)
-            return getattr(result, "search_keyword", None)
+            keyword = getattr(result, "search_keyword", None)
+            self._store_keyword(key, keyword)
+            return keyword
+        except Exception as e:
+            print(f"Error extracting keyword: {e}")
+            return None
+
+    async def aextract_keyword(self, user_input: str) -> Optional[str]:
+        """Async version of extract_keyword"""
+        key, keyword = self._cached_keyword(user_input)
+        if keyword is not None:
+            return keyword
+
+        try:
+            conversation = self._keyword_messages(user_input)
+            result = await self._ainvoke(self.keyword_llm, conversation)
+            keyword = getattr(result, "search_keyword", None)
+            self._store_keyword(key, keyword)
+            return keyword
         except Exception as e:
             print(f"Error extracting keyword: {e}")
             return None
@@ -171,26 +421,53 @@ class LLMProcessor:
     def review_documents(self, docs: list[Document], user_input: str) -> Optional[str]:
         """Review documents for relevancy to user question"""
         try:
-            # Create documents text for the prompt
-            documents_text = ""
-            for i, doc in enumerate(docs, 1):
-                documents_text += f"Document {i}:\n{doc}\n\n"
-
-            system_prompt = self.prompts["document_review"].format(
-                documents_text=documents_text
-            )
-
-            conversation = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=f"User question: {user_input}"),
-            ]
-
+            conversation = self._review_messages(docs, user_input)
             result = self.relevancy_llm.invoke(conversation)
             return getattr(result, "relevancy", None)
         except Exception as e:
             print(f"Error reviewing documents: {e}")
             return None
 
+    async def areview_documents(
+        self, docs: list[Document], user_input: str
+    ) -> Optional[str]:
+        """Async version of review_documents"""
+        try:
+            conversation = self._review_messages(docs, user_input)
+            result = await self._ainvoke(self.relevancy_llm, conversation)
+            return getattr(result, "relevancy", None)
+        except Exception as e:
+            print(f"Error reviewing documents: {e}")
+            return None
+
+    def summarize_conversation(
+        self, summary: str, turns: list[tuple[str, str]]
+    ) -> Optional[str]:
+        """Fold conversation turns into a running summary"""
+        try:
+            conversation = self._summary_messages(summary, turns)
+            return self._response_text(self.llm.invoke(conversation))
+        except Exception as e:
+            print(f"Error summarizing conversation: {e}")
+            return None
+
+    async def asummarize_conversation(
+        self, summary: str, turns: list[tuple[str, str]]
+    ) -> Optional[str]:
+        """Async version of summarize_conversation"""
+        try:
+            conversation = self._summary_messages(summary, turns)
+            return self._response_text(await self._ainvoke(self.llm, conversation))
+        except Exception as e:
+            print(f"Error summarizing conversation: {e}")
+            return None
+
+    async def awarm_up(self):
+        """Open the connection to the model API with a one-token call"""
+        await self._ainvoke(
+            self.llm.bind(max_tokens=1), [HumanMessage(content="Reply with OK")]
+        )
+
     def generate_answer(
         self,
         documents: List[str],
@@ -198,31 +475,49 @@ class LLMProcessor:
         chat_history: List[BaseMessage] = [],
     ):
         try:
-            context_documents = ""
-            for i, doc in enumerate(documents, 1):
-                context_documents += f"Document {i}:\n{doc.strip()}\n\n"
-
-            system_prompt = self.prompts["answer_generation"].format(
-                context_documents=context_documents
-            )
+            conversation = self._answer_messages(documents, user_question, chat_history)
+            response = self.llm.invoke(conversation)
+            return self._response_text(response)
 
-            conversation: List[BaseMessage] = [SystemMessage(content=system_prompt)]
+        except Exception as e:
+            print(f"Error generating answer: {e}")
+            return f"{ANSWER_ERROR_PREFIX}: {str(e)}"
 
-            if chat_history:
-                conversation.extend(chat_history)
+    async def agenerate_answer(
+        self,
+        documents: List[str],
+        user_question: str,
+        chat_history: List[BaseMessage] = [],
+    ):
+        try:
+            conversation = self._answer_messages(documents, user_question, chat_history)
+            response = await self._ainvoke(self.llm, conversation)
+            return self._response_text(response)
 
-            conversation.append(HumanMessage(content=user_question))
+        except Exception as e:
+            print(f"Error generating answer: {e}")
+            return f"{ANSWER_ERROR_PREFIX}: {str(e)}"
 
-            response = self.llm.invoke(conversation)
+    async def agenerate_short_answer(
+        self,
+        documents: List[str],
+        user_question: str,
+        chat_history: List[BaseMessage] = [],
+    ) -> Optional[str]:
+        """Short answer from the fast model; None when it is not configured or fails"""
+        if self.fast_llm is None:
+            return None
 
-            if hasattr(response, "content"):
-                return response.content
-            else:
-                return str(response)
+        try:
+            conversation = self._answer_messages(
+                documents, user_question, chat_history, prompt="short_answer"
+            )
+            response = await self._ainvoke(self.fast_llm, conversation)
+            return self._response_text(response) or None
 
         except Exception as e:
-            print(f"Error generating answer: {e}")
-            return f"I encountered an error while generating the answer: {str(e)}"
+            print(f"Error generating short answer: {e}")
+            return None
 
 
 if __name__ == "__main__":
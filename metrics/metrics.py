@@ -0,0 +1,234 @@
+import time
+import bisect
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# USD per million tokens as (input, output); unknown models are counted at zero cost
+MODEL_PRICES: dict[str, tuple[float, float]] = {
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "text-embedding-3-large": (0.13, 0.0),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HELP = {
+    "rag_node_seconds": "Wall time of each workflow node",
+    "rag_llm_seconds": "Wall time of LLM calls",
+    "rag_llm_tokens_total": "LLM tokens by direction",
+    "rag_answer_path_total": "Answers by path (full generation, fast model or extractive)",
+    "rag_embedding_seconds": "Wall time of embedding calls",
+    "rag_embedding_tokens_total": "Tokens sent to the embedding model",
+    "rag_embedding_batches_total": "Batched query embedding requests sent",
+    "rag_embedding_batched_queries_total": "Query embeddings served through batches",
+    "rag_search_seconds": "Wall time of web search requests",
+    "rag_cost_usd_total": "Estimated spend on model calls",
+    "rag_ingest_seconds": "Wall time of ingestion runs that parsed and embedded files",
+    "rag_http_request_seconds": "Wall time of HTTP requests until the response starts",
+    "rag_requests_shed_total": "Questions rejected with 503 because the server was full",
+    "rag_requests_in_flight": "Questions currently being answered",
+    "rag_requests_queued": "Questions waiting for a free slot",
+    "rag_cache_hits": "Cache hits since start",
+    "rag_cache_misses": "Cache misses since start",
+    "rag_cache_entries": "Entries currently cached",
+    "rag_corpus_chunks": "Chunks in the searchable corpus",
+}
+
+
+class RequestTimings:
+    """Durations recorded while serving one request, summed per stage"""
+
+    def __init__(self):
+        self.stages: dict[str, float] = defaultdict(float)
+        self.started_at = time.perf_counter()
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] += seconds
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            **{
+                stage: round(seconds * 1000, 1)
+                for stage, seconds in self.stages.items()
+            },
+            "total": round((time.perf_counter() - self.started_at) * 1000, 1),
+        }
+
+    def server_timing(self) -> str:
+        return ", ".join(
+            f"{stage};dur={duration}" for stage, duration in self.as_dict().items()
+        )
+
+
+request_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+current_node: ContextVar[str] = ContextVar("current_node", default="")
+
+
+def label_key(labels: dict[str, str]) -> tuple[tuple[str, str], ...]:
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(labels: tuple[tuple[str, str], ...], **extra: str) -> str:
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    """Process-wide counters and histograms rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: dict[str, dict[tuple, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+        # name -> labels -> (bucket counts, sum, count)
+        self.histograms: dict[str, dict[tuple, list]] = defaultdict(dict)
+
+    def inc(self, name: str, value: float = 1.0, **labels: str):
+        with self.lock:
+            self.counters[name][label_key(labels)] += value
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        key = label_key(labels)
+        with self.lock:
+            series = self.histograms[name].setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+            index = bisect.bisect_left(BUCKETS, seconds)
+            if index < len(BUCKETS):
+                series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self, gauges: Optional[dict[str, dict[tuple, float]]] = None) -> str:
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                lines += [
+                    f"# HELP {name} {HELP.get(name, name)}",
+                    f"# TYPE {name} counter",
+                ]
+                for labels, value in series.items():
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+
+            for name, series in sorted(self.histograms.items()):
+                lines += [
+                    f"# HELP {name} {HELP.get(name, name)}",
+                    f"# TYPE {name} histogram",
+                ]
+                for labels, (buckets, total, count) in series.items():
+                    cumulative = 0
+                    for bound, bucket in zip(BUCKETS, buckets):
+                        cumulative += bucket
+                        lines.append(
+                            f"{name}_bucket{format_labels(labels, le=str(bound))} {cumulative}"
+                        )
+                    lines.append(
+                        f"{name}_bucket{format_labels(labels, le='+Inf')} {count}"
+                    )
+                    lines.append(f"{name}_sum{format_labels(labels)} {total}")
+                    lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+        for name, series in sorted((gauges or {}).items()):
+            lines += [f"# HELP {name} {HELP.get(name, name)}", f"# TYPE {name} gauge"]
+            for labels, value in series.items():
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def timed(name: str, stage: str, **labels: str):
+    """Observe the block's wall time in histogram `name` and the current request's timings"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        metrics.observe(name, seconds, **labels)
+        timings = request_timings.get()
+        if timings is not None:
+            timings.add(stage, seconds)
+
+
+def instrument_node(name: str, node):
+    """Wrap an async workflow node or router so its wall time is recorded"""
+
+    async def run(state):
+        token = current_node.set(name)
+        try:
+            with timed("rag_node_seconds", name, node=name):
+                return await node(state)
+        finally:
+            current_node.reset(token)
+
+    run.__name__ = name
+    return run
+
+
+def record_cost(model: str, input_tokens: int = 0, output_tokens: int = 0):
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    cost = (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+    if cost:
+        metrics.inc("rag_cost_usd_total", cost, model=model)
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records wall time, token usage and estimated cost of every chat model call"""
+
+    run_inline = True
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.started: dict[UUID, tuple[float, str]] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        self.started[run_id] = (time.perf_counter(), current_node.get() or "none")
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        started, node = self.started.pop(run_id, (time.perf_counter(), "none"))
+        seconds = time.perf_counter() - started
+        metrics.observe("rag_llm_seconds", seconds, model=self.model_name, node=node)
+
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(
+                    getattr(generation, "message", None), "usage_metadata", None
+                )
+                if usage:
+                    input_tokens += usage.get("input_tokens", 0)
+                    output_tokens += usage.get("output_tokens", 0)
+
+        metrics.inc(
+            "rag_llm_tokens_total",
+            input_tokens,
+            model=self.model_name,
+            direction="input",
+        )
+        metrics.inc(
+            "rag_llm_tokens_total",
+            output_tokens,
+            model=self.model_name,
+            direction="output",
+        )
+        record_cost(self.model_name, input_tokens, output_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self.started.pop(run_id, None)
@@ -1,29 +1,132 @@
-from langchain_community.document_loaders import PyPDFLoader
-import os
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from typing import Optional
+from pdf_loader.structured import ParseCache, extract_documents
+from tokenizer.tokenizer import Tokenizer, get_encoding, token_counter
 import glob
 
-# Method 1: Using glob to find all PDF files
-pdf_files = glob.glob("./paper/*.pdf")
+# text-embedding-3 models count tokens with cl100k_base
+EMBEDDING_ENCODING = "cl100k_base"
 
-docs = []
 
-for pdf_file in pdf_files:
-    print(f"Loading: {pdf_file}")
-    loader = PyPDFLoader(
-        file_path=pdf_file,
-        mode="single",
-        pages_delimiter=""
+def load_pdf(
+    pdf_path: str,
+    content_hash: Optional[str] = None,
+    parse_directory: Optional[str] = None,
+) -> list[Document]:
+    """Text blocks and tables of one PDF (see extract_documents), served from the
+    parse cache in `parse_directory` when the file was parsed before
+    """
+    cache = None
+    if content_hash is not None and parse_directory is not None:
+        cache = ParseCache(parse_directory)
+
+    docs = cache.load(content_hash) if cache is not None else None
+    if docs is None:
+        docs = extract_documents(pdf_path)
+        if cache is not None:
+            cache.save(content_hash, docs)
+    else:
+        print(f"Using cached parse: {pdf_path}")
+
+    # The cache is keyed by content, so the path is only attached here
+    return [
+        Document(page_content=doc.page_content, metadata={**doc.metadata, "source": pdf_path})
+        for doc in docs
+    ]
+
+
+def split_hierarchy(
+    docs: list[Document],
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    child_chunk_size: Optional[int] = None,
+    child_chunk_overlap: int = 0,
+    tokenizer: Tokenizer = "tiktoken",
+) -> tuple[list[str], list[dict], list[str]]:
+    """Split documents into parent chunks and, with `child_chunk_size`, each parent
+    into small child chunks for embedding.
+
+    Returns (texts, metadatas, parents). Each child's metadata holds the index of
+    its parent in `parent_id`; without children the chunks are returned as-is
+    and `parents` is empty.
+    """
+    count_tokens = token_counter(get_encoding(EMBEDDING_ENCODING, tokenizer))
+    parent_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=count_tokens
     )
-    
-    docs_lazy = loader.lazy_load()
-    
-    for doc in docs_lazy:
-        docs.append(doc)
-
-print(f"Total documents loaded: {len(docs)}")
-
-if docs:
-    print(f"\nFirst document content preview:")
-    print(docs[0].page_content[:100])
-    print(f"\nFirst document metadata:")
-    print(docs[0].metadata)
\ No newline at end of file
+    parent_splits = parent_splitter.split_documents(docs)
+
+    if child_chunk_size is None:
+        texts = [doc.page_content for doc in parent_splits]
+        metadatas = [doc.metadata for doc in parent_splits]
+        return texts, metadatas, []
+
+    child_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=child_chunk_size,
+        chunk_overlap=child_chunk_overlap,
+        length_function=count_tokens,
+    )
+    texts, metadatas, parents = [], [], []
+    for parent_id, parent in enumerate(parent_splits):
+        parents.append(parent.page_content)
+        # A table is searched as a whole, rows are meaningless without their header
+        if parent.metadata.get("type") == "table":
+            children = [parent.page_content]
+        else:
+            children = child_splitter.split_text(parent.page_content)
+        for child in children:
+            texts.append(child)
+            metadatas.append({**parent.metadata, "parent_id": parent_id})
+
+    return texts, metadatas, parents
+
+
+def split_pdf(
+    pdf_path: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    child_chunk_size: Optional[int] = None,
+    child_chunk_overlap: int = 0,
+    content_hash: Optional[str] = None,
+    parse_directory: Optional[str] = None,
+    tokenizer: Tokenizer = "tiktoken",
+) -> tuple[list[str], list[dict], list[int], list[str]]:
+    """Parse (or load the cached parse of) and split one PDF; returns chunk texts,
+    metadata, embedding token counts and parent sections (see split_hierarchy).
+
+    Top-level and free of shared state so it can run in a process pool.
+    """
+    texts, metadatas, parents = split_hierarchy(
+        load_pdf(pdf_path, content_hash, parse_directory),
+        chunk_size,
+        chunk_overlap,
+        child_chunk_size,
+        child_chunk_overlap,
+        tokenizer,
+    )
+
+    count_tokens = token_counter(get_encoding(EMBEDDING_ENCODING, tokenizer))
+    tokens = [count_tokens(text) for text in texts]
+
+    return texts, metadatas, tokens, parents
+
+
+if __name__ == "__main__":
+    pdf_files = glob.glob("./paper/*.pdf")
+
+    docs = []
+
+    for pdf_file in pdf_files:
+        print(f"Loading: {pdf_file}")
+        docs.extend(load_pdf(pdf_file))
+
+    print(f"Total documents loaded: {len(docs)}")
+
+    if docs:
+        print(f"\nFirst document content preview:")
+        print(docs[0].page_content[:100])
+        print(f"\nFirst document metadata:")
+        print(docs[0].metadata)
+        tables = [doc for doc in docs if doc.metadata["type"] == "table"]
+        print(f"\nTables found: {len(tables)}")
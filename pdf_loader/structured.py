@@ -0,0 +1,249 @@
+import os
+import re
+import json
+from dataclasses import dataclass
+from typing import Optional
+from langchain_core.documents import Document
+
+# Bump when extraction changes so cached parses and index entries are rebuilt
+PARSER_VERSION = 1
+
+CAPTION_PATTERN = re.compile(r"^Table\s*\d+\s*[:.]")
+NUMBER_PATTERN = re.compile(r"^[(<>±~]?[-+]?\d+(?:[.,]\d+)*%?[)*]?$")
+# "3.2 Title", or "A.1 Title" for appendices
+NUMBERED_HEADING_PATTERN = re.compile(
+    r"^((?:\d{1,2}|[A-H])(?:\.\d{1,2})*)\.?\s+[A-Z][^.:]*[^.:,]$"
+)
+# Appendix letters are numbered from here on, after the body's sections
+APPENDIX_NUMBER = 100
+NAMED_HEADINGS = {
+    "abstract",
+    "introduction",
+    "related work",
+    "background",
+    "conclusion",
+    "conclusions",
+    "discussion",
+    "limitations",
+    "acknowledgments",
+    "acknowledgements",
+    "references",
+    "appendix",
+}
+MAX_HEADING_WORDS = 10
+MAX_HEADER_ROWS = 2
+
+
+def heading_number(line: str) -> Optional[tuple[int, ...]]:
+    match = NUMBERED_HEADING_PATTERN.match(line)
+    if match is None or len(line.split()) > MAX_HEADING_WORDS:
+        return None
+    top, *rest = match.group(1).split(".")
+    top_number = APPENDIX_NUMBER + ord(top) - ord("A") if top.isalpha() else int(top)
+    return (top_number, *(int(part) for part in rest))
+
+
+def follows(previous: tuple[int, ...], number: tuple[int, ...]) -> bool:
+    """Whether `number` can be the next heading after `previous` (3.2 -> 3.2.1, 3.3
+    or 4); numbered footnotes and list items rarely fit the sequence
+    """
+    if number == (*previous, 1):
+        return True
+    for depth in range(1, len(previous) + 1):
+        if number == (*previous[: depth - 1], previous[depth - 1] + 1):
+            return True
+    return number == (1,) and not previous
+
+
+def is_named_heading(line: str) -> bool:
+    return line.lower() in NAMED_HEADINGS
+
+
+def numbers_in(line: str) -> int:
+    return sum(bool(NUMBER_PATTERN.match(token)) for token in line.split())
+
+
+def is_row(line: str) -> bool:
+    """Table rows carry several numbers; prose lines rarely do"""
+    return numbers_in(line) >= 2
+
+
+def table_span(
+    lines: list[str], caption_start: int, caption_end: int
+) -> tuple[int, int]:
+    """Line range of the rows of the table captioned at lines[caption_start:caption_end].
+
+    Rows (with up to MAX_HEADER_ROWS column header lines) follow the caption, or
+    precede it when nothing row-like follows; an empty range when neither does.
+    """
+    headers = 0
+    while (
+        headers < MAX_HEADER_ROWS
+        and caption_end + headers < len(lines)
+        and not is_row(lines[caption_end + headers])
+    ):
+        headers += 1
+
+    end = caption_end + headers
+    if end < len(lines) and is_row(lines[end]):
+        while end < len(lines) and is_row(lines[end]):
+            end += 1
+        return caption_end, end
+
+    start = caption_start
+    while start > 0 and is_row(lines[start - 1]):
+        start -= 1
+    # One column header line above rows that precede their caption
+    if 0 < start < caption_start and len(lines[start - 1].split()) <= MAX_HEADING_WORDS:
+        if heading_number(lines[start - 1]) is None:
+            start -= 1
+    return start, caption_start
+
+
+@dataclass
+class Outline:
+    """The section open at the current point of the paper"""
+
+    section: str = ""
+    number: tuple[int, ...] = ()
+
+    def advance(self, line: str) -> bool:
+        """Move to the section `line` starts, if it is a heading"""
+        number = heading_number(line)
+        # Appendix A only opens after the references
+        after_references = self.section.lower() in ("references", "appendix")
+        if number == (APPENDIX_NUMBER,) and after_references:
+            self.section, self.number = line, number
+            return True
+        if number is not None and follows(self.number, number):
+            self.section, self.number = line, number
+            return True
+        if is_named_heading(line):
+            self.section = line
+            return True
+        return False
+
+
+def extract_page(text: str, page: int, outline: Outline) -> list[Document]:
+    """Split one page into text blocks per section and captioned tables, in reading
+    order; `outline` carries the open section from page to page
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    # (first line, block) so tables and text can be put back in page order
+    blocks: list[tuple[int, Document]] = []
+    taken = [False] * len(lines)
+
+    # Tables first, so their rows never end up in the surrounding text
+    i = 0
+    while i < len(lines):
+        if not CAPTION_PATTERN.match(lines[i]):
+            i += 1
+            continue
+
+        caption_end = i + 1
+        # Captions run on until a sentence ends or the rows start
+        while (
+            caption_end < len(lines)
+            and caption_end - i < 4
+            and not lines[caption_end - 1].endswith(".")
+            and not is_row(lines[caption_end])
+        ):
+            caption_end += 1
+
+        start, end = table_span(lines, i, caption_end)
+        if start < end:
+            caption = " ".join(lines[i:caption_end])
+            table = Document(
+                page_content="\n".join([caption, *lines[start:end]]),
+                metadata={"page": page, "type": "table", "caption": caption},
+            )
+            blocks.append((min(i, start), table))
+            for j in (*range(i, caption_end), *range(start, end)):
+                taken[j] = True
+        i = max(caption_end, end)
+
+    first_line = 0
+    block: list[str] = []
+    # Section open at each line
+    section_at: dict[int, str] = {}
+
+    def close_block():
+        if block:
+            text = Document(
+                page_content="\n".join(block),
+                metadata={
+                    "page": page,
+                    "section": section_at[first_line],
+                    "type": "text",
+                },
+            )
+            blocks.append((first_line, text))
+            block.clear()
+
+    for index, line in enumerate(lines):
+        if taken[index]:
+            section_at[index] = outline.section
+            continue
+        if outline.advance(line):
+            close_block()
+        section_at[index] = outline.section
+        if not block:
+            first_line = index
+        block.append(line)
+    close_block()
+
+    blocks.sort(key=lambda item: item[0])
+    for index, document in blocks:
+        document.metadata.setdefault("section", section_at[index])
+    return [document for _, document in blocks]
+
+
+def extract_documents(pdf_path: str) -> list[Document]:
+    """Parse a PDF into text blocks that keep their page and section, and tables
+    (caption plus rows) as separate blocks; `source` is added by the caller
+    """
+    from pypdf import PdfReader
+
+    documents: list[Document] = []
+    outline = Outline()
+    for page, pdf_page in enumerate(PdfReader(pdf_path).pages, 1):
+        documents.extend(extract_page(pdf_page.extract_text() or "", page, outline))
+    return documents
+
+
+class ParseCache:
+    """Parsed PDF content on disk, keyed by the file's content hash, so re-splitting
+    or re-embedding a file never parses it again
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}.v{PARSER_VERSION}.json")
+
+    def load(self, content_hash: str) -> Optional[list[Document]]:
+        try:
+            with open(self._path(content_hash)) as f:
+                blocks = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return [
+            Document(page_content=text, metadata=metadata) for text, metadata in blocks
+        ]
+
+    def save(self, content_hash: str, documents: list[Document]):
+        path = self._path(content_hash)
+        # Parsing runs in several processes at once; publish each entry atomically
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump([[doc.page_content, doc.metadata] for doc in documents], f)
+        os.replace(tmp_path, path)
+
+    def prune(self, keep: set[str]):
+        """Remove parses of files that are no longer part of the corpus"""
+        suffix = f".v{PARSER_VERSION}.json"
+        for name in os.listdir(self.directory):
+            if not name.endswith(suffix) or name[: -len(suffix)] not in keep:
+                os.remove(os.path.join(self.directory, name))
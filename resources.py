@@ -0,0 +1,137 @@
+from typing import Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_openai import OpenAIEmbeddings
+from cache.memo import CachedEmbeddings, CachedSearch, make_cache
+from cache.response_cache import ResponseCache
+from config import Settings
+from context_builder.context_builder import ContextBuilder
+from graph import create_workflow
+from llm import LLMProcessor
+from pdf_loader.pdf_loader import EMBEDDING_ENCODING
+from search.search import SearchBackend, SearchClient
+from session.memory import ConversationMemory
+from throttle.admission import AdmissionController
+from throttle.batching import BatchedEmbeddings
+from tokenizer.tokenizer import get_encoding, token_counter
+from vector_store.vector_store import PDFVectorStore
+
+
+class AppResources:
+    """Long-lived clients shared by every request, plus the compiled workflow.
+
+    The chat model, embedding model and search backend can be replaced, e.g. by
+    the local stand-ins in `benchmark.fakes`.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        chat_model: Optional[BaseChatModel] = None,
+        embedding: Optional[Embeddings] = None,
+        search_backend: Optional[SearchBackend] = None,
+    ):
+        self.settings = settings
+
+        self.memo_caches = {
+            name: make_cache(
+                name,
+                max_entries=settings.memo_cache_size,
+                path=settings.memo_cache_path,
+                ttl_seconds=settings.search_cache_ttl_seconds if name == "search" else None,
+            )
+            for name in ("embedding", "keyword", "search")
+        }
+
+        self.llm = LLMProcessor(
+            model_name=settings.model_name,
+            temperature=settings.temperature,
+            keyword_cache=self.memo_caches["keyword"],
+            llm=chat_model,
+            max_concurrency=settings.max_concurrent_llm_calls,
+            fast_model_name=(
+                settings.fast_path_model_name
+                if settings.fast_path_mode == "model"
+                else None
+            ),
+            fast_max_tokens=settings.fast_path_max_tokens,
+        )
+        self.context = ContextBuilder(
+            model_name=settings.model_name,
+            budget_tokens=settings.context_budget_tokens,
+            dedup_threshold=settings.context_dedup_threshold,
+            trim_sentences=settings.context_trim_sentences,
+            tokenizer=settings.tokenizer,
+        )
+        self.sessions = ConversationMemory(
+            make_cache(
+                "session",
+                max_entries=settings.session_max_sessions,
+                path=settings.session_store_path,
+                ttl_seconds=settings.session_ttl_seconds,
+                # Read every turn from SQLite, other workers may have added some
+                shared=True,
+            ),
+            self.llm,
+            self.context.count_tokens,
+            max_history_tokens=settings.session_history_tokens,
+            recent_turns=settings.session_recent_turns,
+        )
+        embedding = embedding or OpenAIEmbeddings(
+            model=settings.embedding_model,
+            dimensions=settings.embedding_dimensions,
+        )
+        # Also applies MAX_CONCURRENT_EMBEDDING_CALLS when batching is off
+        embedding = BatchedEmbeddings(
+            embedding,
+            window_seconds=settings.embedding_batch_window_ms / 1000,
+            max_batch_size=settings.embedding_batch_size,
+            max_concurrency=settings.max_concurrent_embedding_calls,
+            count_tokens=token_counter(
+                get_encoding(EMBEDDING_ENCODING, settings.tokenizer)
+            ),
+        )
+        # Cache hits never wait for a batch
+        self.embedding = CachedEmbeddings(embedding, self.memo_caches["embedding"])
+        self.vector_store = PDFVectorStore.from_settings(
+            settings, embedding=self.embedding
+        )
+        self.search = CachedSearch(
+            SearchClient.from_settings(settings, backend=search_backend),
+            self.memo_caches["search"],
+        )
+
+        self.response_cache = None
+        if settings.response_cache_enabled:
+            self.response_cache = ResponseCache(
+                self.embedding,
+                max_entries=settings.response_cache_size,
+                ttl_seconds=settings.response_cache_ttl_seconds,
+                similarity_threshold=settings.response_cache_similarity,
+            )
+
+        self.graph = create_workflow(self)
+        self.admission = AdmissionController(
+            max_in_flight=settings.admission_max_in_flight,
+            max_queue=settings.admission_max_queue,
+            queue_timeout_seconds=settings.admission_queue_timeout_seconds,
+            retry_after_seconds=settings.admission_retry_after_seconds,
+        )
+
+    async def warm_up(self):
+        """Make a first embedding and LLM call so the first request does not pay
+        for connection setup"""
+        await self.embedding.aembed_query("warm-up")
+        await self.llm.awarm_up()
+
+    async def aclose(self):
+        await self.search.aclose()
+
+    def cache_stats(self) -> dict:
+        caches = dict(self.memo_caches)
+        if self.response_cache is not None:
+            caches["response"] = self.response_cache
+        return {
+            name: {**cache.stats.as_dict(), "size": len(cache)}
+            for name, cache in caches.items()
+        }
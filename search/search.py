@@ -1,10 +1,225 @@
+import os
 import json
-from langchain_community.tools import BraveSearch
+import time
+import random
+import asyncio
+import httpx
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional, TYPE_CHECKING
 from rich import print
 from dotenv import load_dotenv
+from metrics.metrics import timed
+
+if TYPE_CHECKING:
+    from config import Settings
 
 load_dotenv()
 
-search = BraveSearch()
+BRAVE_SEARCH_URL = "https://api.search.brave.com/res/v1/web/search"
+
+
+class SearchError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SearchBackend(ABC):
+    """Turns a query into a list of {"title", "link", "snippet"} results"""
+
+    @abstractmethod
+    async def search(self, http: httpx.AsyncClient, query: str) -> list[dict]: ...
+
+
+class BraveBackend(SearchBackend):
+    def __init__(self, api_key: Optional[str] = None, count: int = 5):
+        self.api_key = api_key or os.environ.get("BRAVE_SEARCH_API_KEY", "")
+        self.count = count
+
+    async def search(self, http: httpx.AsyncClient, query: str) -> list[dict]:
+        response = await http.get(
+            BRAVE_SEARCH_URL,
+            params={"q": query, "count": self.count},
+            headers={"Accept": "application/json", "X-Subscription-Token": self.api_key},
+        )
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            raise SearchError(
+                f"Brave search returned {response.status_code}",
+                retry_after=float(retry_after) if retry_after else None,
+            )
+        response.raise_for_status()
+
+        results = response.json().get("web", {}).get("results", [])
+        return [
+            {
+                "title": result.get("title", ""),
+                "link": result.get("url", ""),
+                "snippet": result.get("description", ""),
+            }
+            for result in results
+        ]
+
+
+class StubBackend(SearchBackend):
+    """Offline backend for tests and benchmarks: canned results from a JSON file
+    ({query: [results]}) or a single placeholder result, after an optional delay.
+    """
+
+    def __init__(self, path: Optional[str] = None, latency_seconds: float = 0.0):
+        self.results: dict[str, list[dict]] = {}
+        if path:
+            with open(path) as f:
+                self.results = json.load(f)
+        self.latency_seconds = latency_seconds
+
+    async def search(self, http: httpx.AsyncClient, query: str) -> list[dict]:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        if query in self.results:
+            return self.results[query]
+        return [
+            {
+                "title": f"Stub result for {query}",
+                "link": "stub://search",
+                "snippet": f"No web results are available offline for: {query}",
+            }
+        ]
+
+
+@dataclass
+class InFlightSearch:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SearchClient:
+    """Async web search over one pooled HTTP client, rate limited by a token bucket.
+
+    Rate-limit and server errors are retried with jittered exponential backoff,
+    and concurrent calls for the same query share a single request, which is
+    cancelled once every caller waiting on it has given up.
+    """
+
+    def __init__(
+        self,
+        backend: SearchBackend,
+        rate_per_second: float = 1.0,
+        burst: int = 1,
+        max_retries: int = 3,
+        timeout_seconds: float = 10.0,
+        max_connections: int = 10,
+    ):
+        self.backend = backend
+        self.backend_name = type(backend).__name__
+        self.limiter = TokenBucket(rate_per_second, burst)
+        self.max_retries = max_retries
+        self.http = httpx.AsyncClient(
+            timeout=timeout_seconds,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        self.in_flight: dict[str, InFlightSearch] = {}
+
+    @classmethod
+    def from_settings(
+        cls, settings: "Settings", backend: Optional[SearchBackend] = None
+    ) -> "SearchClient":
+        if backend is None and settings.search_backend == "stub":
+            backend = StubBackend(settings.search_stub_path)
+        elif backend is None:
+            backend = BraveBackend(count=settings.search_results)
+        return cls(
+            backend,
+            rate_per_second=settings.search_rate_per_second,
+            burst=settings.search_burst,
+            max_retries=settings.search_max_retries,
+            timeout_seconds=settings.web_search_timeout_seconds,
+            max_connections=settings.search_max_connections,
+        )
+
+    async def search(self, query: str) -> list[dict]:
+        search = self.in_flight.get(query)
+        if search is None:
+            search = InFlightSearch(asyncio.create_task(self._search_with_retry(query)))
+            self.in_flight[query] = search
+            search.task.add_done_callback(
+                lambda _, search=search: self._forget(query, search)
+            )
+
+        search.waiters += 1
+        try:
+            # Shielded so one caller timing out does not cancel it for the others
+            return await asyncio.shield(search.task)
+        finally:
+            search.waiters -= 1
+            if search.waiters == 0 and not search.task.done():
+                # Unlisted right away, so a later caller starts a new request instead
+                # of joining the cancelled one
+                self._forget(query, search)
+                search.task.cancel()
+
+    def _forget(self, query: str, search: InFlightSearch):
+        # A newer request for the same query may have taken the slot meanwhile
+        if self.in_flight.get(query) is search:
+            del self.in_flight[query]
+
+    async def _search_with_retry(self, query: str) -> list[dict]:
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire()
+            try:
+                with timed(
+                    "rag_search_seconds", "search_request", backend=self.backend_name
+                ):
+                    return await self.backend.search(self.http, query)
+            except (SearchError, httpx.TransportError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(30.0, 2**attempt) * random.uniform(0.5, 1.5)
+                if isinstance(e, SearchError) and e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                print(f"Search failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        return []
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+if __name__ == "__main__":
+
+    async def main():
+        client = SearchClient(BraveBackend())
+        try:
+            print(await client.search("what is agentic ai"))
+        finally:
+            await client.aclose()
 
-print(json.loads(search.run("what is agentic ai")))
+    asyncio.run(main())
@@ -1,27 +1,343 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import json
+import time
+import asyncio
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from graph import GraphState, create_workflow
+from typing import TYPE_CHECKING, Optional
+from config import Settings
+from metrics.metrics import RequestTimings, metrics, request_timings
+from throttle.admission import Overloaded
+
+# The workflow, model clients and index are imported and loaded by `start` in the
+# background, so the server accepts connections (and answers /healthz) right away
+if TYPE_CHECKING:
+    from resources import AppResources
+
+STARTING_RETRY_AFTER_SECONDS = 5
+
 
 class Question(BaseModel):
     question: str
+    # Continue this conversation; omit for a one-off question
+    session_id: Optional[str] = None
+
+
+def build_resources(settings: Settings) -> "AppResources":
+    from resources import AppResources
+
+    return AppResources(settings)
+
+
+async def start(app: FastAPI, settings: Settings):
+    """Import the workflow, load the index and warm up the model clients, then
+    mark the server ready"""
+    started = time.perf_counter()
+    try:
+        resources = await asyncio.to_thread(build_resources, settings)
+    except Exception as e:
+        print(f"Startup failed: {e}")
+        app.state.startup_error = str(e)
+        return
+    print(f"Resources loaded in {time.perf_counter() - started:.1f}s")
+
+    if settings.warm_up_enabled:
+        try:
+            await resources.warm_up()
+            app.state.warmed_up = True
+        except Exception as e:
+            # Upstream hiccups must not keep the pod out of rotation for good
+            print(f"Warm-up failed, serving anyway: {e}")
+
+    if settings.watch_interval_seconds > 0:
+        from vector_store.watcher import DirectoryWatcher
+
+        app.state.watcher = DirectoryWatcher(
+            resources.vector_store, settings.watch_interval_seconds
+        )
+        app.state.watcher.start()
+
+    app.state.resources = resources
+    print(f"Ready in {time.perf_counter() - started:.1f}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.resources = None
+    app.state.startup_error = None
+    app.state.warmed_up = False
+    app.state.watcher = None
+    startup = asyncio.create_task(start(app, Settings.from_env()))
+
+    yield
+
+    startup.cancel()
+    if app.state.watcher is not None:
+        await app.state.watcher.stop()
+    if app.state.resources is not None:
+        await app.state.resources.aclose()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
+
+
+def ready_resources(request: Request) -> "AppResources":
+    """The shared resources, or a 503 while the server is still starting"""
+    resources = getattr(request.app.state, "resources", None)
+    if resources is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is starting",
+            headers={"Retry-After": str(STARTING_RETRY_AFTER_SECONDS)},
+        )
+    return resources
+
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.observe(
+        "rag_http_request_seconds",
+        time.perf_counter() - started,
+        method=request.method,
+        path=getattr(route, "path", "unmatched"),
+        status=str(response.status_code),
+    )
+    return response
 
 
 @app.get("/", status_code=204)
 async def root():
     return
 
-@app.post("/ask")
-async def ask(question: Question):
-    graph = create_workflow()
-    inputs: GraphState = {
-        "question": question.question,
-        "chat_history": [],
-        "generation": None,
-        "keyword": "",
-        "web_search": None,
-        "documents": [],
+
+@app.get("/healthz")
+async def healthz(request: Request, response: Response):
+    """Liveness: the process serves requests and startup has not failed"""
+    error = getattr(request.app.state, "startup_error", None)
+    if error is not None:
+        response.status_code = 503
+        return {"status": "failed", "error": error}
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz(request: Request, response: Response):
+    """Readiness: the index is loaded and the model clients are warmed up"""
+    state = request.app.state
+    resources = getattr(state, "resources", None)
+    if resources is None:
+        response.status_code = 503
+        error = getattr(state, "startup_error", None)
+        if error is not None:
+            return {"status": "failed", "error": error}
+        return {"status": "starting"}
+    return {
+        "status": "ready",
+        "warmed_up": getattr(state, "warmed_up", False),
+        "corpus_version": resources.vector_store.corpus_version,
+        "chunks": len(resources.vector_store.texts),
     }
-    result = graph.invoke(input=inputs)
-    return result["generation"]
\ No newline at end of file
+
+
+async def lookup_cached_answer(resources: "AppResources", question: str):
+    if resources.response_cache is None:
+        return None
+    return await resources.response_cache.alookup(
+        question, resources.vector_store.corpus_version
+    )
+
+
+def store_cached_answer(resources: "AppResources", lookup, generation: Optional[str]):
+    from llm import ANSWER_ERROR_PREFIX
+
+    if lookup is None or not generation or generation.startswith(ANSWER_ERROR_PREFIX):
+        return
+    resources.response_cache.store(lookup, generation)
+
+
+@app.get("/cache/stats")
+async def cache_stats(request: Request):
+    resources = ready_resources(request)
+    return resources.cache_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics(request: Request):
+    """Prometheus text exposition of request, node, model and cache metrics"""
+    resources = getattr(request.app.state, "resources", None)
+    gauges: dict = {}
+    # Cache and corpus gauges appear once startup has loaded them
+    if resources is not None:
+        gauges = {"rag_cache_hits": {}, "rag_cache_misses": {}, "rag_cache_entries": {}}
+        for name, stats in resources.cache_stats().items():
+            labels = (("cache", name),)
+            gauges["rag_cache_hits"][labels] = stats["hits"]
+            gauges["rag_cache_misses"][labels] = stats["misses"]
+            gauges["rag_cache_entries"][labels] = stats["size"]
+        gauges["rag_corpus_chunks"] = {(): len(resources.vector_store.texts)}
+        gauges["rag_requests_in_flight"] = {(): resources.admission.in_flight}
+        gauges["rag_requests_queued"] = {(): resources.admission.queued}
+
+    return PlainTextResponse(
+        metrics.render(gauges), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.post("/admin/reindex")
+async def reindex(request: Request, force: bool = False):
+    """Apply added, changed and deleted PDFs now; `force` re-hashes every file"""
+    resources = ready_resources(request)
+    token = resources.settings.admin_token
+    if not token:
+        raise HTTPException(status_code=404, detail="Set ADMIN_TOKEN to enable /admin")
+    if request.headers.get("X-Admin-Token") != token:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+    changes = await asyncio.to_thread(resources.vector_store.sync_directory, force)
+    return {**changes, "corpus_version": resources.vector_store.corpus_version}
+
+
+def session_history(resources: "AppResources", question: Question) -> list:
+    if not question.session_id:
+        return []
+    return resources.sessions.messages(resources.sessions.load(question.session_id))
+
+
+def remember_turn(resources: "AppResources", question: Question, generation) -> bool:
+    """Store the turn so the session's next question sees it; returns whether the
+    history is due for summarizing"""
+    if question.session_id and generation:
+        return resources.sessions.record(
+            question.session_id, question.question, generation
+        )
+    return False
+
+
+def overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after_seconds)},
+    )
+
+
+async def admit(resources: "AppResources"):
+    """Wait for a request slot, or fail fast with 503 when the server is full"""
+    try:
+        await resources.admission.acquire()
+    except Overloaded as e:
+        raise overloaded(e)
+
+
+@app.post("/ask")
+async def ask(
+    question: Question,
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    timings: bool = False,
+):
+    """Answer a question; X-Answer-Path tells how (`full`, `fast`, `extractive` or
+    `cache`) and `timings` adds a per-stage Server-Timing header"""
+    resources = ready_resources(request)
+    from graph import initial_state
+    request_timings.set(RequestTimings())
+    chat_history = session_history(resources, question)
+
+    await admit(resources)
+    try:
+        # Answers that depend on earlier turns are neither cached nor served from cache
+        lookup = None
+        if not chat_history:
+            lookup = await lookup_cached_answer(resources, question.question)
+
+        if lookup is not None and lookup.generation is not None:
+            generation = lookup.generation
+            path = "cache"
+        else:
+            inputs = initial_state(question.question, chat_history)
+            result = await resources.graph.ainvoke(input=inputs)
+            generation = result["generation"]
+            path = result.get("answer_path") or "full"
+            store_cached_answer(resources, lookup, generation)
+    finally:
+        resources.admission.release()
+
+    # Summarizing a long history must not delay the response
+    if remember_turn(resources, question, generation):
+        background_tasks.add_task(resources.sessions.summarize, question.session_id)
+    response.headers["X-Answer-Path"] = path
+    if timings:
+        response.headers["Server-Timing"] = request_timings.get().server_timing()
+    return generation
+
+
+@app.post("/ask/stream")
+async def ask_stream(question: Question, request: Request, timings: bool = False):
+    """Stream progress and answer tokens; `timings` adds a final per-stage timings event"""
+    resources = ready_resources(request)
+    from graph import initial_state, stream_workflow
+    chat_history = session_history(resources, question)
+    inputs = initial_state(question.question, chat_history)
+
+    # A full server still answers with a 503 before the response starts, but the slot
+    # is only taken once the body is sent: a response that is never iterated (client
+    # gone before the body starts) then holds none
+    try:
+        resources.admission.check()
+    except Overloaded as e:
+        raise overloaded(e)
+
+    async def events():
+        request_timings.set(RequestTimings())
+        try:
+            await resources.admission.acquire()
+        except Overloaded as e:
+            data = {"error": str(e), "retry_after": e.retry_after_seconds}
+            yield f"event: error\ndata: {json.dumps(data)}\n\n"
+            return
+
+        try:
+            lookup = None
+            if not chat_history:
+                lookup = await lookup_cached_answer(resources, question.question)
+
+            if lookup is not None and lookup.generation is not None:
+                remember_turn(resources, question, lookup.generation)
+                for event, data in [
+                    ("cache", {"hit": True}),
+                    ("token", {"content": lookup.generation}),
+                    ("done", {"generation": lookup.generation}),
+                ]:
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                return
+
+            async for event, data in stream_workflow(resources.graph, inputs):
+                if event == "done":
+                    store_cached_answer(resources, lookup, data["generation"])
+                    remember_turn(resources, question, data["generation"])
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                if event == "done" and timings:
+                    breakdown = request_timings.get().as_dict()
+                    yield f"event: timings\ndata: {json.dumps(breakdown)}\n\n"
+        finally:
+            resources.admission.release()
+
+    # Summarizing a long history runs once the stream is sent
+    summarize = None
+    if question.session_id:
+        summarize = BackgroundTask(resources.sessions.summarize, question.session_id)
+    return StreamingResponse(
+        events(), media_type="text/event-stream", background=summarize
+    )
+
+
+@app.delete("/sessions/{session_id}", status_code=204)
+async def clear_session(session_id: str, request: Request):
+    resources = ready_resources(request)
+    resources.sessions.clear(session_id)
\ No newline at end of file
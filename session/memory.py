@@ -0,0 +1,119 @@
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from cache.memo import LRUCache
+from llm import ANSWER_ERROR_PREFIX, LLMProcessor
+
+
+@dataclass
+class Session:
+    summary: str = ""
+    # (question, answer) pairs, oldest first
+    turns: list[tuple[str, str]] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {"summary": self.summary, "turns": [list(turn) for turn in self.turns]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Session":
+        return cls(data["summary"], [tuple(turn) for turn in data["turns"]])
+
+
+class ConversationMemory:
+    """Chat history per session, kept in a bounded TTL cache (in memory or SQLite).
+
+    Recent turns are kept verbatim; once the history exceeds `max_history_tokens`,
+    everything but the last `recent_turns` is folded into a running summary.
+    record() stores a turn right away, summarize() can run later in the background.
+    Both change the stored session with cache.update(), so with a shared SQLite
+    cache workers never overwrite each other's turns.
+    """
+
+    def __init__(
+        self,
+        cache: LRUCache,
+        llm: LLMProcessor,
+        count_tokens: Callable[[str], int],
+        max_history_tokens: int = 2000,
+        recent_turns: int = 2,
+    ):
+        self.cache = cache
+        self.llm = llm
+        self.count_tokens = count_tokens
+        self.max_history_tokens = max_history_tokens
+        self.recent_turns = recent_turns
+        self.summarizing: set[str] = set()
+
+    def load(self, session_id: str) -> Session:
+        data = self.cache.get(session_id)
+        return Session.from_dict(data) if data is not None else Session()
+
+    def messages(self, session: Session) -> list[BaseMessage]:
+        messages: list[BaseMessage] = []
+        if session.summary:
+            messages.append(
+                SystemMessage(content=f"Summary of the earlier conversation:\n{session.summary}")
+            )
+        for question, answer in session.turns:
+            messages.extend([HumanMessage(content=question), AIMessage(content=answer)])
+        return messages
+
+    def history_tokens(self, session: Session) -> int:
+        return self.count_tokens(session.summary) + sum(
+            self.count_tokens(question) + self.count_tokens(answer)
+            for question, answer in session.turns
+        )
+
+    def older_turns(self, session: Session) -> list[tuple[str, str]]:
+        """Turns due to be folded into the summary, if the history is over budget"""
+        older = session.turns[: -self.recent_turns] if self.recent_turns else session.turns
+        if older and self.history_tokens(session) > self.max_history_tokens:
+            return older
+        return []
+
+    def record(self, session_id: str, question: str, answer: str) -> bool:
+        """Append a turn; returns whether the session is due for summarize()"""
+        if answer.startswith(ANSWER_ERROR_PREFIX):
+            return False
+
+        def append(data: Optional[dict]) -> dict:
+            session = Session.from_dict(data) if data is not None else Session()
+            session.turns.append((question, answer))
+            return session.as_dict()
+
+        session = Session.from_dict(self.cache.update(session_id, append))
+        return bool(self.older_turns(session))
+
+    async def summarize(self, session_id: str):
+        """Fold the older turns into the summary, keeping turns recorded meanwhile"""
+        if session_id in self.summarizing:
+            return
+        self.summarizing.add(session_id)
+        try:
+            session = self.load(session_id)
+            older = self.older_turns(session)
+            if not older:
+                return
+            summary = await self.llm.asummarize_conversation(session.summary, older)
+            # On failure keep the turns and try again after the next one
+            if summary is None:
+                return
+
+            def merge(data: Optional[dict]) -> Optional[dict]:
+                if data is None:
+                    return None
+                latest = Session.from_dict(data)
+                # Summarized by another worker while the summary was written
+                if latest.summary != session.summary or latest.turns[: len(older)] != older:
+                    return data
+                latest.summary = summary
+                latest.turns = latest.turns[len(older) :]
+                return latest.as_dict()
+
+            # Cleared sessions stay cleared
+            self.cache.update(session_id, merge)
+        finally:
+            self.summarizing.discard(session_id)
+
+    def clear(self, session_id: str):
+        self.cache.delete(session_id)
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from benchmark.fakes import FakeEmbeddings
+from metrics.metrics import label_key, metrics
+from throttle.batching import BatchedEmbeddings
+
+
+class TrackingEmbeddings(FakeEmbeddings):
+    """Records the largest number of calls in flight and the size of each request"""
+
+    def __init__(self):
+        super().__init__(dimensions=8, latency_seconds=0.01)
+        self.in_flight = self.max_in_flight = 0
+        self.requests: list[int] = []
+
+    async def track(self, call, size: int):
+        self.requests.append(size)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await call
+        finally:
+            self.in_flight -= 1
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.track(super().aembed_query(text), 1)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.track(super().aembed_documents(texts), len(texts))
+
+
+async def embed_all(embedding: BatchedEmbeddings, texts: list[str]) -> list[list[float]]:
+    return await asyncio.gather(*(embedding.aembed_query(text) for text in texts))
+
+
+def test_concurrent_queries_share_one_request():
+    upstream = TrackingEmbeddings()
+    embedding = BatchedEmbeddings(upstream, window_seconds=0.01)
+
+    texts = ["spider", "bird", "spider", "wikisql"]
+    vectors = asyncio.run(embed_all(embedding, texts))
+
+    assert upstream.requests == [3]
+    assert vectors == [upstream.vector(text) for text in texts]
+
+
+def test_concurrency_cap_applies_without_batching():
+    upstream = TrackingEmbeddings()
+    embedding = BatchedEmbeddings(upstream, window_seconds=0, max_concurrency=2)
+
+    asyncio.run(embed_all(embedding, [f"query {i}" for i in range(6)]))
+
+    assert upstream.requests == [1] * 6
+    assert upstream.max_in_flight == 2
+
+
+def test_query_tokens_and_cost_are_recorded():
+    upstream = TrackingEmbeddings()
+    upstream.model = "text-embedding-3-small"
+    embedding = BatchedEmbeddings(
+        upstream, window_seconds=0.01, count_tokens=lambda text: len(text.split())
+    )
+    key = label_key({"model": "text-embedding-3-small"})
+    tokens = metrics.counters["rag_embedding_tokens_total"][key]
+    cost = metrics.counters["rag_cost_usd_total"][key]
+
+    # Duplicates within a batch are sent, and billed, once
+    asyncio.run(embed_all(embedding, ["spider dev set", "bird", "spider dev set"]))
+    embedding.embed_query("wikisql test set")
+
+    assert metrics.counters["rag_embedding_tokens_total"][key] - tokens == 7
+    assert metrics.counters["rag_cost_usd_total"][key] - cost == pytest.approx(
+        7 * 0.02 / 1_000_000
+    )
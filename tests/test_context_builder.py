@@ -0,0 +1,83 @@
+from langchain_core.documents import Document
+from context_builder.context_builder import ContextBuilder, shingles
+from pdf_loader.pdf_loader import split_hierarchy
+
+# No word 3-gram repeats, so any shared one comes from the splitter's overlap
+PAPER = " ".join(
+    f"Run {i} scored {i}a on spider{i} with prompt{i}." for i in range(150)
+)
+
+
+def adjacent_chunks() -> list[str]:
+    texts, _, _ = split_hierarchy(
+        [Document(page_content=PAPER)],
+        chunk_size=200,
+        chunk_overlap=40,
+        tokenizer="words",
+    )
+    return texts[:2]
+
+
+def test_adjacent_chunks_share_the_splitter_overlap():
+    first, second = adjacent_chunks()
+    shared = shingles(first) & shingles(second)
+    assert 0 < len(shared) / len(shingles(second)) < 0.8
+
+
+def test_overlap_is_cut_from_the_later_chunk():
+    first, second = adjacent_chunks()
+    builder = ContextBuilder(tokenizer="words", budget_tokens=10_000)
+
+    context = builder.build("unrelated question", [first, second])
+
+    assert context.documents[0] == first
+    assert context.trimmed_overlaps == 1
+    assert context.dropped_duplicates == 0
+    assert not shingles(context.documents[0]) & shingles(context.documents[1])
+    # Nothing but the repeated span is lost
+    assert second.endswith(context.documents[1])
+
+
+def test_unrelated_chunks_are_kept_whole():
+    documents = [
+        "Zero-shot prompts were evaluated on Spider with execution accuracy.",
+        "Few-shot demonstrations improved results on the BIRD benchmark.",
+    ]
+    context = ContextBuilder(tokenizer="words").build("unrelated question", documents)
+
+    assert context.documents == documents
+    assert context.trimmed_overlaps == 0
+
+
+def test_documents_are_ranked_by_retrieval_score():
+    documents = [
+        "Few-shot prompting on BIRD raised execution accuracy.",
+        "Spider zero-shot prompting execution accuracy Spider prompting results.",
+    ]
+    builder = ContextBuilder(tokenizer="words")
+
+    # The second shares more terms with the question but scored lower at retrieval
+    context = builder.build(
+        "spider zero-shot prompting execution accuracy", documents, [0.8, 0.4]
+    )
+    assert context.documents == documents
+
+
+def test_web_snippets_follow_by_overlap_with_the_question():
+    retrieved = "A retrieved chunk about schema linking."
+    snippets = ["Weather is sunny today.", "Spider benchmark leaderboard for text-to-SQL."]
+    builder = ContextBuilder(tokenizer="words")
+
+    context = builder.build("spider benchmark", [retrieved, *snippets], [0.3])
+
+    assert context.documents == [retrieved, snippets[1], snippets[0]]
+
+
+def test_budget_cuts_the_lowest_scored_document():
+    documents = ["alpha beta gamma delta", "spider spider spider spider"]
+    builder = ContextBuilder(tokenizer="words", budget_tokens=4)
+
+    context = builder.build("spider", documents, [0.9, 0.2])
+
+    assert context.documents == [documents[0]]
+    assert context.dropped_over_budget == 1
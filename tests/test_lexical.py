@@ -0,0 +1,62 @@
+import numpy as np
+from vector_store.lexical import BM25Index, LexicalSegment, reciprocal_rank_fusion
+
+TEXTS = [
+    "Zero-shot prompting on the Spider benchmark.",
+    "Few-shot demonstrations for text-to-SQL on BIRD.",
+    "Spider and BIRD measure execution accuracy.",
+    "Schema linking maps question words to columns.",
+    "Execution accuracy of few-shot prompting on Spider dev.",
+]
+
+
+def test_only_chunks_sharing_a_term_are_ranked():
+    index = BM25Index()
+    index.build(TEXTS)
+
+    ids, scores = index.search("What is schema linking?", k=5)
+
+    assert ids.tolist() == [3]
+    assert scores[0] > 0
+
+
+def test_rare_terms_outweigh_common_ones():
+    index = BM25Index()
+    index.build(TEXTS)
+
+    # "spider" is in three chunks, "demonstrations" only in one
+    ids, _ = index.search("spider demonstrations", k=5)
+
+    assert ids[0] == 1
+    assert set(ids.tolist()) == {0, 1, 2, 4}
+
+
+def test_segments_score_like_one_index_over_the_corpus():
+    whole = BM25Index()
+    whole.build(TEXTS)
+    # Postings as stored per file, and read back from the index entry
+    segmented = BM25Index()
+    segmented.build_from_segments(
+        [
+            LexicalSegment.from_dict(LexicalSegment.from_texts(TEXTS[:2]).as_dict()),
+            LexicalSegment.from_dict(LexicalSegment.from_texts(TEXTS[2:]).as_dict()),
+        ]
+    )
+
+    for query in ["spider execution accuracy", "few-shot BIRD", "columns"]:
+        expected_ids, expected_scores = whole.search(query, k=5)
+        ids, scores = segmented.search(query, k=5)
+        assert ids.tolist() == expected_ids.tolist()
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+
+
+def test_rrf_favours_ids_ranked_well_in_both_lists():
+    dense = np.array([7, 3, 5])
+    lexical = np.array([3, 9, 7])
+
+    fused = reciprocal_rank_fusion([dense, lexical], k=60)
+
+    assert fused[:2] == [3, 7]
+    assert set(fused) == {3, 5, 7, 9}
+    # 5 is third in one list, 9 second in the other
+    assert fused.index(9) < fused.index(5)
@@ -0,0 +1,36 @@
+from langchain_core.documents import Document
+from config import Settings
+from pdf_loader.pdf_loader import split_hierarchy
+
+SECTION = " ".join(f"Sentence {i} about text-to-SQL evaluation." for i in range(200))
+
+
+def test_child_chunks_can_be_disabled():
+    assert Settings().child_chunk_size == 300
+    for value in ("0", "", "none"):
+        assert Settings(child_chunk_size=value).child_chunk_size is None
+
+
+def test_flat_split_returns_chunks_without_parents():
+    docs = [Document(page_content=SECTION, metadata={"source": "a.pdf", "page": 1})]
+
+    texts, metadatas, parents = split_hierarchy(
+        docs, chunk_size=100, chunk_overlap=20, tokenizer="words"
+    )
+
+    assert len(texts) > 1
+    assert parents == []
+    assert all("parent_id" not in metadata for metadata in metadatas)
+    assert all(metadata["source"] == "a.pdf" for metadata in metadatas)
+
+
+def test_hierarchical_split_maps_children_to_parents():
+    docs = [Document(page_content=SECTION, metadata={"source": "a.pdf", "page": 1})]
+
+    texts, metadatas, parents = split_hierarchy(
+        docs, chunk_size=100, chunk_overlap=20, child_chunk_size=30, tokenizer="words"
+    )
+
+    assert len(texts) > len(parents) > 1
+    for text, metadata in zip(texts, metadatas):
+        assert text in parents[metadata["parent_id"]]
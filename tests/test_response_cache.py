@@ -0,0 +1,72 @@
+import asyncio
+from benchmark.fakes import FakeEmbeddings
+from cache import response_cache
+from cache.response_cache import ResponseCache
+
+
+def lookup(cache: ResponseCache, question: str, corpus_version: str = "v1"):
+    return asyncio.run(cache.alookup(question, corpus_version))
+
+
+def answer(cache: ResponseCache, question: str, generation: str, corpus_version="v1"):
+    cache.store(lookup(cache, question, corpus_version), generation)
+
+
+def make_cache(**kwargs) -> ResponseCache:
+    return ResponseCache(FakeEmbeddings(dimensions=256, latency_seconds=0), **kwargs)
+
+
+def test_same_question_hits_after_normalization():
+    cache = make_cache()
+    answer(cache, "What is Spider?", "A text-to-SQL benchmark.")
+
+    assert lookup(cache, "  what is   SPIDER ").generation == "A text-to-SQL benchmark."
+    assert cache.stats.hits == 1
+
+
+def test_similarity_threshold_decides_near_matches():
+    cache = make_cache(similarity_threshold=0.8)
+    answer(cache, "execution accuracy of few-shot prompting on spider", "73%")
+
+    # Same terms in another order embed identically with the bag-of-words fake
+    assert lookup(cache, "few-shot prompting on spider execution accuracy").generation
+    assert lookup(cache, "how are schema links found").generation is None
+
+    strict = make_cache(similarity_threshold=1.01)
+    answer(strict, "execution accuracy of few-shot prompting on spider", "73%")
+    reordered = lookup(strict, "few-shot prompting on spider execution accuracy")
+    assert reordered.generation is None
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = make_cache(ttl_seconds=60)
+    answer(cache, "What is Spider?", "A benchmark.")
+
+    now[0] += 59
+    assert lookup(cache, "What is Spider?").generation == "A benchmark."
+    now[0] += 2
+    assert lookup(cache, "What is Spider?").generation is None
+    assert len(cache) == 0
+
+
+def test_a_new_corpus_version_evicts_every_answer():
+    cache = make_cache()
+    answer(cache, "What is Spider?", "A benchmark.", corpus_version="v1")
+    answer(cache, "What is BIRD?", "Another benchmark.", corpus_version="v1")
+
+    assert lookup(cache, "What is Spider?", corpus_version="v2").generation is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_answers_are_evicted_first():
+    cache = make_cache(max_entries=2, similarity_threshold=1.01)
+    answer(cache, "What is Spider?", "Spider")
+    answer(cache, "What is BIRD?", "BIRD")
+    lookup(cache, "What is Spider?")
+    answer(cache, "What is WikiSQL?", "WikiSQL")
+
+    assert lookup(cache, "What is Spider?").generation == "Spider"
+    assert lookup(cache, "What is BIRD?").generation is None
+    assert lookup(cache, "What is WikiSQL?").generation == "WikiSQL"
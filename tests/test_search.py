@@ -0,0 +1,133 @@
+import time
+import asyncio
+import httpx
+import pytest
+import search.search
+from search.search import SearchBackend, SearchClient, SearchError, TokenBucket
+
+
+class ScriptedBackend(SearchBackend):
+    """Answers after `latency_seconds`, first raising the queued errors in order"""
+
+    def __init__(self, latency_seconds: float = 0.0, errors: list = ()):
+        self.latency_seconds = latency_seconds
+        self.errors = list(errors)
+        self.calls: list[str] = []
+        self.cancelled = 0
+
+    async def search(self, http: httpx.AsyncClient, query: str) -> list[dict]:
+        self.calls.append(query)
+        try:
+            await asyncio.sleep(self.latency_seconds)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.errors:
+            raise self.errors.pop(0)
+        return [{"title": query, "link": "stub://search", "snippet": query}]
+
+
+def run_client(backend: SearchBackend, scenario, **kwargs):
+    async def main():
+        client = SearchClient(backend, rate_per_second=1000, burst=100, **kwargs)
+        try:
+            return await scenario(client)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(search.search.random, "uniform", lambda a, b: 0.0)
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    async def acquire_all() -> list[float]:
+        bucket = TokenBucket(rate=20, capacity=2)
+        start = time.monotonic()
+        times = []
+        for _ in range(5):
+            await bucket.acquire()
+            times.append(time.monotonic() - start)
+        return times
+
+    times = asyncio.run(acquire_all())
+
+    assert times[1] < 0.02
+    # Three more tokens refill at 20 per second
+    assert times[4] >= 0.14
+
+
+def test_concurrent_searches_for_one_query_share_a_request():
+    backend = ScriptedBackend(latency_seconds=0.05)
+
+    async def scenario(client):
+        return await asyncio.gather(
+            client.search("spider"), client.search("spider"), client.search("bird")
+        )
+
+    results = run_client(backend, scenario)
+
+    assert sorted(backend.calls) == ["bird", "spider"]
+    assert results[0] == results[1]
+
+
+def test_shared_search_survives_one_caller_giving_up():
+    backend = ScriptedBackend(latency_seconds=0.1)
+
+    async def scenario(client):
+        patient = asyncio.create_task(client.search("spider"))
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.search("spider"), 0.02)
+        return await patient
+
+    assert run_client(backend, scenario)[0]["title"] == "spider"
+    assert backend.calls == ["spider"]
+    assert backend.cancelled == 0
+
+
+def test_search_is_cancelled_once_every_caller_gave_up():
+    backend = ScriptedBackend(latency_seconds=0.1)
+
+    async def scenario(client):
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.search("spider"), 0.02)
+        assert client.in_flight == {}
+        # A later caller starts a new request instead of joining the cancelled one
+        return await client.search("spider")
+
+    assert run_client(backend, scenario)[0]["title"] == "spider"
+    assert backend.calls == ["spider", "spider"]
+    assert backend.cancelled == 1
+
+
+def test_transient_errors_are_retried(no_backoff):
+    backend = ScriptedBackend(
+        errors=[SearchError("Brave search returned 429"), httpx.ConnectError("reset")]
+    )
+
+    results = run_client(backend, lambda client: client.search("spider"))
+
+    assert results[0]["title"] == "spider"
+    assert len(backend.calls) == 3
+
+
+def test_retries_stop_after_max_retries(no_backoff):
+    backend = ScriptedBackend(errors=[SearchError("Brave search returned 503")] * 5)
+
+    with pytest.raises(SearchError):
+        run_client(backend, lambda client: client.search("spider"), max_retries=2)
+    assert len(backend.calls) == 3
+
+
+def test_other_errors_are_not_retried(no_backoff):
+    request = httpx.Request("GET", "https://api.search.brave.com")
+    response = httpx.Response(401, request=request)
+    error = httpx.HTTPStatusError("unauthorized", request=request, response=response)
+    backend = ScriptedBackend(errors=[error])
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run_client(backend, lambda client: client.search("spider"))
+    assert len(backend.calls) == 1
@@ -0,0 +1,60 @@
+import asyncio
+from cache.memo import SQLiteCache
+from session.memory import ConversationMemory
+
+
+class FakeSummarizer:
+    """Records a turn from another worker while the summary is being written"""
+
+    def __init__(self):
+        self.during_summary = None
+
+    async def asummarize_conversation(self, summary: str, turns: list) -> str:
+        if self.during_summary is not None:
+            self.during_summary()
+        return f"{len(turns)} earlier turns"
+
+
+def worker(path, llm=None) -> ConversationMemory:
+    """One uvicorn worker's session store"""
+    return ConversationMemory(
+        SQLiteCache(str(path), "session", shared=True),
+        llm,
+        lambda text: len(text.split()),
+        max_history_tokens=10,
+        recent_turns=1,
+    )
+
+
+def test_workers_see_each_others_turns(tmp_path):
+    first, second = worker(tmp_path / "sessions.db"), worker(tmp_path / "sessions.db")
+    first.record("s", "q1", "a1")
+    assert first.load("s").turns == [("q1", "a1")]
+
+    second.record("s", "q2", "a2")
+    first.record("s", "q3", "a3")
+    assert second.load("s").turns == [("q1", "a1"), ("q2", "a2"), ("q3", "a3")]
+
+
+def test_clear_applies_to_every_worker(tmp_path):
+    first, second = worker(tmp_path / "sessions.db"), worker(tmp_path / "sessions.db")
+    first.record("s", "q1", "a1")
+    assert first.load("s").turns
+
+    second.clear("s")
+    assert first.load("s").turns == []
+
+
+def test_summary_keeps_turns_recorded_by_another_worker(tmp_path):
+    llm = FakeSummarizer()
+    first = worker(tmp_path / "sessions.db", llm)
+    second = worker(tmp_path / "sessions.db")
+    first.record("s", "first question here", "first answer here")
+    assert first.record("s", "second question here", "second answer here")
+
+    llm.during_summary = lambda: second.record("s", "q3", "a3")
+    asyncio.run(first.summarize("s"))
+
+    session = second.load("s")
+    assert session.summary == "1 earlier turns"
+    assert session.turns == [("second question here", "second answer here"), ("q3", "a3")]
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from vector_store.quantized import QuantizedVectors, quantize
+from vector_store.vector_store import BruteForceIndex, IVFIndex
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    return (vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def clustered(rows: int = 4000, dimension: int = 64, clusters: int = 40, seed: int = 0):
+    """Unit vectors around random topics, like chunk embeddings, and queries near them"""
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(clusters, dimension))
+    vectors = unit(
+        topics[rng.integers(clusters, size=rows)] + rng.normal(size=(rows, dimension))
+    )
+    noise = rng.normal(size=(50, dimension)) / np.sqrt(dimension)
+    queries = unit(vectors[rng.choice(rows, 50, replace=False)] + 0.5 * noise)
+    return vectors, queries
+
+
+def recall(index, exact: BruteForceIndex, queries: np.ndarray, k: int = 10) -> float:
+    found = 0
+    for query in queries:
+        expected, _ = exact.search(query, k)
+        ids, _ = index.search(query, k)
+        found += len(set(ids.tolist()) & set(expected.tolist()))
+    return found / (k * len(queries))
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    vectors, queries = clustered()
+    exact = BruteForceIndex()
+    exact.build(vectors)
+    return vectors, queries, exact
+
+
+def test_brute_force_returns_the_best_matches_in_order(corpus):
+    vectors, queries, exact = corpus
+
+    ids, scores = exact.search(queries[0], 10)
+
+    expected = np.argsort(-(vectors @ queries[0]))[:10]
+    assert ids.tolist() == expected.tolist()
+    np.testing.assert_allclose(scores, vectors[ids] @ queries[0], rtol=1e-5)
+
+
+def test_ivf_recall_against_brute_force(corpus):
+    vectors, queries, exact = corpus
+    index = IVFIndex(nprobe=8)
+    index.build(vectors)
+
+    assert index.centroids is not None
+    assert recall(index, exact, queries) >= 0.95
+
+
+def test_ivf_probing_every_list_is_exact(corpus):
+    vectors, queries, exact = corpus
+    index = IVFIndex(nlist=16, nprobe=16)
+    index.build(vectors)
+
+    for query in queries[:10]:
+        ids, scores = index.search(query, 10)
+        expected_ids, expected_scores = exact.search(query, 10)
+        assert ids.tolist() == expected_ids.tolist()
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+
+def test_small_corpora_are_searched_exactly(corpus):
+    vectors, queries, _ = corpus
+    index = IVFIndex(min_train_size=1024)
+    index.build(vectors[:500])
+    exact = BruteForceIndex()
+    exact.build(vectors[:500])
+
+    assert index.centroids is None
+    assert recall(index, exact, queries) == 1.0
+
+
+def quantized(vectors: np.ndarray, precision: str) -> QuantizedVectors:
+    codes, scales = quantize(vectors, precision)
+    return QuantizedVectors(codes, scales, vectors)
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_quantized_scan_recall_with_exact_scores(corpus, precision):
+    vectors, queries, exact = corpus
+    index = BruteForceIndex(rerank_candidates=50)
+    index.build(quantized(vectors, precision))
+
+    assert recall(index, exact, queries) >= 0.99
+    # Candidates are re-ranked with the float32 vectors
+    ids, scores = index.search(queries[0], 10)
+    np.testing.assert_allclose(scores, vectors[ids] @ queries[0], rtol=1e-5)
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_ivf_over_quantized_codes(corpus, precision):
+    vectors, queries, exact = corpus
+    index = IVFIndex(nprobe=8, rerank_candidates=50)
+    index.build(quantized(vectors, precision))
+
+    assert recall(index, exact, queries) >= 0.95
+    ids, scores = index.search(queries[0], 10)
+    np.testing.assert_allclose(scores, vectors[ids] @ queries[0], rtol=1e-5)
+
+
+def test_approximate_scores_of_selected_rows(corpus):
+    vectors, queries, _ = corpus
+    codes = quantized(vectors, "int8")
+    ids = np.array([3, 17, 256, 3999])
+
+    np.testing.assert_allclose(
+        codes.approximate_scores(queries[0], ids),
+        codes.approximate_scores(queries[0])[ids],
+        rtol=1e-5,
+    )
+    np.testing.assert_allclose(
+        codes.approximate_scores(queries[0], ids), vectors[ids] @ queries[0], atol=0.02
+    )
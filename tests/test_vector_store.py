@@ -0,0 +1,117 @@
+import os
+from benchmark.fakes import FakeEmbeddings
+from vector_store.vector_store import PDFVectorStore
+
+
+def write_pdf(path, text: str):
+    """A one-page PDF showing `text`, one line per sentence"""
+    lines = [line.strip() + "." for line in text.split(".") if line.strip()]
+    stream = "BT /F1 11 Tf 14 TL 72 760 Td " + " ".join(
+        f"({line}) Tj T*" for line in lines
+    ) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        "/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    data += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode()
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def paper(topic: str) -> str:
+    return " ".join(f"Finding {i} about {topic} holds on dataset {i}." for i in range(20))
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    embedded = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.embedded += len(texts)
+        return await super().aembed_documents(texts)
+
+
+def open_store(tmp_path, embedding=None) -> PDFVectorStore:
+    return PDFVectorStore(
+        pdf_directory=str(tmp_path / "pdfs"),
+        index_directory=str(tmp_path / "index"),
+        chunk_size=60,
+        chunk_overlap=0,
+        child_chunk_size=None,
+        tokenizer="words",
+        hybrid=True,
+        ingest_workers=1,
+        embedding=embedding or FakeEmbeddings(dimensions=32, latency_seconds=0),
+    )
+
+
+def sources(store: PDFVectorStore) -> set[str]:
+    return {os.path.basename(metadata["source"]) for metadata in store.metadatas}
+
+
+def test_sync_directory_applies_added_updated_and_deleted_files(tmp_path):
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    write_pdf(pdfs / "spider.pdf", paper("spider"))
+    write_pdf(pdfs / "bird.pdf", paper("bird"))
+
+    store = open_store(tmp_path)
+    assert sources(store) == {"spider.pdf", "bird.pdf"}
+    assert len(store.embeddings) == len(store.texts)
+    version = store.corpus_version
+
+    # Unchanged files are neither re-embedded nor change the corpus version
+    assert store.sync_directory() == {"added": [], "updated": [], "deleted": []}
+    assert store.corpus_version == version
+
+    write_pdf(pdfs / "wikisql.pdf", paper("wikisql"))
+    write_pdf(pdfs / "bird.pdf", paper("bird v2 with more detail"))
+    os.remove(pdfs / "spider.pdf")
+    changes = store.sync_directory()
+
+    assert [os.path.basename(path) for path in changes["added"]] == ["wikisql.pdf"]
+    assert [os.path.basename(path) for path in changes["updated"]] == ["bird.pdf"]
+    assert [os.path.basename(path) for path in changes["deleted"]] == ["spider.pdf"]
+    assert store.corpus_version != version
+    assert sources(store) == {"bird.pdf", "wikisql.pdf"}
+    assert len(store.embeddings) == len(store.texts) == len(store.metadatas)
+    assert not any("spider" in text for text in store.texts)
+    assert any("bird v2" in text for text in store.texts)
+
+    top = store.retrieve_doc("wikisql")[0]
+    assert os.path.basename(top.metadata["source"]) == "wikisql.pdf"
+
+
+def test_restart_reuses_the_index(tmp_path):
+    pdfs = tmp_path / "pdfs"
+    pdfs.mkdir()
+    write_pdf(pdfs / "spider.pdf", paper("spider"))
+    embedding = CountingEmbeddings(dimensions=32, latency_seconds=0)
+    first = open_store(tmp_path, embedding)
+    assert embedding.embedded == len(first.texts)
+
+    embedding = CountingEmbeddings(dimensions=32, latency_seconds=0)
+    second = open_store(tmp_path, embedding)
+
+    assert embedding.embedded == 0
+    assert second.texts == first.texts
+    assert second.corpus_version == first.corpus_version
@@ -0,0 +1,55 @@
+import asyncio
+from metrics.metrics import metrics
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after_seconds: int):
+        super().__init__("Server is overloaded")
+        self.retry_after_seconds = retry_after_seconds
+
+
+class AdmissionController:
+    """Bounds the requests served at once; up to `max_queue` more wait for a slot
+    for at most `queue_timeout_seconds`, anything beyond that is rejected at once.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 32,
+        max_queue: int = 64,
+        queue_timeout_seconds: float = 10.0,
+        retry_after_seconds: int = 2,
+    ):
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.queued = 0
+
+    def check(self):
+        """Raise Overloaded when acquire() would be rejected at once; takes no slot"""
+        if self.slots.locked() and self.queued >= self.max_queue:
+            metrics.inc("rag_requests_shed_total", reason="queue_full")
+            raise Overloaded(self.retry_after_seconds)
+
+    async def acquire(self):
+        """Take a slot or raise Overloaded; pair every success with release()"""
+        self.check()
+        if self.slots.locked():
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self.slots.acquire(), self.queue_timeout_seconds)
+            except asyncio.TimeoutError:
+                metrics.inc("rag_requests_shed_total", reason="queue_timeout")
+                raise Overloaded(self.retry_after_seconds)
+            finally:
+                self.queued -= 1
+        else:
+            await self.slots.acquire()
+
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self.slots.release()
@@ -0,0 +1,105 @@
+import asyncio
+from typing import Callable, Optional
+from langchain_core.embeddings import Embeddings
+from metrics.metrics import metrics, record_cost
+
+
+class BatchedEmbeddings(Embeddings):
+    """Coalesces concurrent `aembed_query` calls arriving within `window_seconds`
+    into one embedding request of up to `max_batch_size` distinct texts, with at
+    most `max_concurrency` requests in flight. A window of 0 sends every query on
+    its own, still within the concurrency cap. With `count_tokens`, the tokens and
+    estimated cost of every query request are recorded.
+
+    Synchronous calls and document embeddings are passed through unchanged.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        window_seconds: float = 0.01,
+        max_batch_size: int = 64,
+        max_concurrency: int = 8,
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ):
+        self.embedding = embedding
+        # Read by CachedEmbeddings and the ingestion metrics
+        self.model = getattr(embedding, "model", type(embedding).__name__)
+        self.dimensions = getattr(embedding, "dimensions", None)
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.count_tokens = count_tokens
+
+        self.pending: list[tuple[str, asyncio.Future]] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.tasks: set[asyncio.Task] = set()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embedding.embed_documents(texts)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        async with self.semaphore:
+            return await self.embedding.aembed_documents(texts)
+
+    def record_usage(self, texts: list[str]):
+        # Document embeddings are recorded by the ingestion pipeline
+        if self.count_tokens is None:
+            return
+        tokens = sum(self.count_tokens(text) for text in texts)
+        metrics.inc("rag_embedding_tokens_total", tokens, model=self.model)
+        record_cost(self.model, input_tokens=tokens)
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = self.embedding.embed_query(text)
+        self.record_usage([text])
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        if self.window_seconds <= 0:
+            async with self.semaphore:
+                vector = await self.embedding.aembed_query(text)
+            self.record_usage([text])
+            return vector
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((text, future))
+
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.window_seconds, self.flush)
+
+        return await future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.create_task(self._embed(batch))
+            # Keep a reference until it finishes so the task is not collected
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _embed(self, batch: list[tuple[str, asyncio.Future]]):
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        metrics.inc("rag_embedding_batches_total")
+        metrics.inc("rag_embedding_batched_queries_total", len(batch))
+
+        try:
+            vectors = await self.aembed_documents(texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.record_usage(texts)
+        by_text = dict(zip(texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
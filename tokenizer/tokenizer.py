@@ -0,0 +1,48 @@
+import re
+from typing import Literal
+
+# "tiktoken" counts like the OpenAI models; "words" needs no BPE files (offline runs)
+Tokenizer = Literal["tiktoken", "words"]
+
+WORD_TOKEN_PATTERN = re.compile(r"\s*(?:\w+|[^\w\s])")
+
+
+class WordEncoding:
+    """Local stand-in for a tiktoken encoding: one token per word or punctuation mark,
+    each with its leading whitespace so decode() gives back the text
+    """
+
+    name = "words"
+
+    def encode(self, text: str, **kwargs) -> list[str]:
+        return WORD_TOKEN_PATTERN.findall(text)
+
+    def decode(self, tokens: list[str]) -> str:
+        return "".join(tokens)
+
+
+def get_encoding(name: str, tokenizer: Tokenizer = "tiktoken"):
+    """tiktoken's encoding `name`, which is downloaded on first use, or WordEncoding"""
+    if tokenizer == "words":
+        return WordEncoding()
+    import tiktoken
+
+    return tiktoken.get_encoding(name)
+
+
+def encoding_for_model(model_name: str, tokenizer: Tokenizer = "tiktoken"):
+    if tokenizer == "words":
+        return WordEncoding()
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def token_counter(encoding):
+    def count_tokens(text: str) -> int:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    return count_tokens
@@ -0,0 +1,184 @@
+import os
+import json
+import fcntl
+import hashlib
+import numpy as np
+from contextlib import contextmanager
+from typing import Optional, Union
+from vector_store.quantized import BLOCK_ROWS, Precision, QuantizedVectors, quantize
+
+
+class IndexCache:
+    """On-disk store of embedded chunks, keyed by PDF content and ingestion settings"""
+
+    def __init__(self, index_directory: str, settings: dict):
+        self.index_directory = index_directory
+        self.settings = settings
+        self.settings_digest = hashlib.sha256(
+            json.dumps(settings, sort_keys=True).encode()
+        ).hexdigest()
+        self.snapshot_directory = os.path.join(index_directory, "snapshots")
+        self.lock_path = os.path.join(index_directory, ".lock")
+
+        os.makedirs(self.snapshot_directory, exist_ok=True)
+
+    @contextmanager
+    def writer_lock(self):
+        """Exclusive across processes: every server worker and ingestion run sharing
+        the directory writes, publishes and prunes it in turn"""
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def content_hash(pdf_path: str) -> str:
+        """Hash of the PDF bytes alone, which also keys its cached parse"""
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def entry_key(self, content_hash: str) -> str:
+        """Combine a PDF's content hash with the splitter/embedding settings"""
+        return hashlib.sha256(f"{self.settings_digest}:{content_hash}".encode()).hexdigest()
+
+    def _paths(self, key: str) -> tuple[str, str]:
+        base = os.path.join(self.index_directory, key)
+        return f"{base}.json", f"{base}.npy"
+
+    def has(self, key: str) -> bool:
+        return all(os.path.exists(path) for path in self._paths(key))
+
+    def load_chunks(
+        self, key: str
+    ) -> tuple[list[str], list[dict], list[str], Optional[dict]]:
+        """Return chunk texts, their metadata, the parent sections they map to and
+        their term postings (see LexicalSegment; None for entries written without)"""
+        chunks_path, _ = self._paths(key)
+        with open(chunks_path) as f:
+            chunks = json.load(f)
+        return (
+            chunks["texts"],
+            chunks["metadatas"],
+            chunks.get("parents", []),
+            chunks.get("lexical"),
+        )
+
+    def load_vectors(
+        self, keys: list[str], precision: Precision = "float32"
+    ) -> Union[np.ndarray, QuantizedVectors]:
+        """Memory-map one consolidated, normalized matrix for these entries in this order.
+
+        The snapshot is written once and then shared read-only through the page
+        cache by every process that opens it.
+        """
+        snapshot_id = hashlib.sha256("\n".join(keys).encode()).hexdigest()
+        base = os.path.join(self.snapshot_directory, snapshot_id)
+        exact_path = f"{base}.float32.npy"
+        codes_path = f"{base}.{precision}.npy"
+        scales_path = f"{base}.scales.npy"
+
+        if not os.path.exists(exact_path):
+            self._write_snapshot(keys, exact_path)
+        exact = np.load(exact_path, mmap_mode="r")
+
+        if precision == "float32":
+            return exact
+
+        if not os.path.exists(codes_path):
+            self._write_codes(exact, precision, codes_path, scales_path)
+
+        scales = np.load(scales_path) if precision == "int8" else None
+        return QuantizedVectors(np.load(codes_path, mmap_mode="r"), scales, exact)
+
+    def _write_snapshot(self, keys: list[str], path: str):
+        shapes = [np.load(self._paths(key)[1], mmap_mode="r").shape for key in keys]
+        rows = sum(shape[0] for shape in shapes)
+        dimension = shapes[0][1] if shapes else 0
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        matrix = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.float32, shape=(rows, dimension)
+        )
+        offset = 0
+        for key, shape in zip(keys, shapes):
+            vectors = np.load(self._paths(key)[1])
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            matrix[offset : offset + shape[0]] = vectors
+            offset += shape[0]
+        matrix.flush()
+        del matrix
+        os.replace(tmp_path, path)
+
+        self.prune_snapshots(os.path.basename(path).split(".")[0])
+
+    def _write_codes(
+        self, exact: np.ndarray, precision: Precision, codes_path: str, scales_path: str
+    ):
+        codes_dtype = np.int8 if precision == "int8" else np.float16
+        tmp_path = f"{codes_path}.{os.getpid()}.tmp"
+        codes = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=codes_dtype, shape=exact.shape
+        )
+        scales = np.empty(len(exact), dtype=np.float32)
+
+        for start in range(0, len(exact), BLOCK_ROWS):
+            block_codes, block_scales = quantize(
+                np.asarray(exact[start : start + BLOCK_ROWS]), precision
+            )
+            codes[start : start + BLOCK_ROWS] = block_codes
+            if block_scales is not None:
+                scales[start : start + BLOCK_ROWS] = block_scales
+
+        codes.flush()
+        del codes
+        if precision == "int8":
+            with open(f"{scales_path}.{os.getpid()}.tmp", "wb") as f:
+                np.save(f, scales)
+            os.replace(f"{scales_path}.{os.getpid()}.tmp", scales_path)
+        os.replace(tmp_path, codes_path)
+
+    def prune_snapshots(self, keep: str):
+        for name in os.listdir(self.snapshot_directory):
+            if not name.startswith(keep):
+                os.remove(os.path.join(self.snapshot_directory, name))
+
+    def save(
+        self,
+        key: str,
+        texts: list[str],
+        metadatas: list[dict],
+        embeddings: list[list[float]],
+        parents: Optional[list[str]] = None,
+        lexical: Optional[dict] = None,
+    ):
+        chunks_path, vectors_path = self._paths(key)
+
+        # Vectors first: the chunk file marks the entry as complete
+        with open(f"{vectors_path}.tmp", "wb") as f:
+            np.save(f, np.asarray(embeddings, dtype=np.float32))
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+
+        with open(f"{chunks_path}.tmp", "w") as f:
+            json.dump(
+                {
+                    "texts": texts,
+                    "metadatas": metadatas,
+                    "parents": parents or [],
+                    "lexical": lexical,
+                },
+                f,
+                default=str,
+            )
+        os.replace(f"{chunks_path}.tmp", chunks_path)
+
+    def prune(self, keep: set[str]):
+        """Remove entries for files that are no longer part of the corpus"""
+        for name in os.listdir(self.index_directory):
+            key, ext = os.path.splitext(name)
+            if ext in (".json", ".npy") and key not in keep:
+                os.remove(os.path.join(self.index_directory, name))
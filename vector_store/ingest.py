@@ -0,0 +1,289 @@
+import os
+import time
+import random
+import multiprocessing
+import httpx
+import openai
+import typer
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, field
+from typing import Annotated, Optional
+from langchain_core.embeddings import Embeddings
+from metrics.metrics import metrics, record_cost, timed
+from pdf_loader.pdf_loader import split_pdf
+from pdf_loader.structured import ParseCache
+from tokenizer.tokenizer import Tokenizer
+from vector_store.index_cache import IndexCache
+from vector_store.lexical import LexicalSegment
+
+
+@dataclass
+class PendingFile:
+    key: str
+    texts: list[str]
+    metadatas: list[dict]
+    parents: list[str] = field(default_factory=list)
+    lexical: Optional[dict] = None
+    embeddings: list[Optional[list[float]]] = field(default_factory=list)
+    remaining: int = 0
+    failed: bool = False
+
+
+def parse_pdf(
+    pdf_path: str, *args
+) -> tuple[list[str], list[dict], list[int], list[str], dict]:
+    """split_pdf (same arguments) plus the chunks' term postings, so the lexical
+    index is built in the parsing processes and stored with the entry"""
+    texts, metadatas, tokens, parents = split_pdf(pdf_path, *args)
+    return texts, metadatas, tokens, parents, LexicalSegment.from_texts(texts).as_dict()
+
+
+def is_transient(error: Exception) -> bool:
+    """Rate limits, timeouts, connection failures and server errors are worth retrying;
+    anything else (bad key, input too long, bugs) fails the same way every time"""
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError))
+
+
+class IngestionPipeline:
+    """Parse and split PDFs in a process pool, then embed chunks from all files in
+    size-capped batches with bounded concurrency, saving each file to the index as
+    soon as its last batch lands. Files already in the index are skipped, so an
+    interrupted run resumes where it stopped, and with a `parse_cache` a file is
+    only ever parsed once per content, whatever the splitter or embedding settings.
+    """
+
+    def __init__(
+        self,
+        index_cache: IndexCache,
+        embedding: Embeddings,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        child_chunk_size: Optional[int] = None,
+        child_chunk_overlap: int = 0,
+        tokenizer: Tokenizer = "tiktoken",
+        workers: Optional[int] = None,
+        concurrency: int = 4,
+        max_batch_size: int = 512,
+        max_batch_tokens: int = 100_000,
+        max_retries: int = 5,
+        parse_cache: Optional[ParseCache] = None,
+    ):
+        self.index_cache = index_cache
+        self.parse_cache = parse_cache
+        # path -> content hash of every file seen, to prune the parse cache
+        self.content_hashes: dict[str, str] = {}
+        self.embedding = embedding
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.child_chunk_size = child_chunk_size
+        self.child_chunk_overlap = child_chunk_overlap
+        self.tokenizer = tokenizer
+        self.workers = workers or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        # CachedEmbeddings keeps the client it wraps in `embedding`
+        client = getattr(embedding, "embedding", embedding)
+        self.model_name = getattr(client, "model", type(client).__name__)
+
+    def embed_with_retry(self, texts: list[str], tokens: int = 0) -> list[list[float]]:
+        for attempt in range(self.max_retries):
+            try:
+                vectors = self.embedding.embed_documents(texts)
+                metrics.inc("rag_embedding_tokens_total", tokens, model=self.model_name)
+                record_cost(self.model_name, input_tokens=tokens)
+                return vectors
+            except Exception as e:
+                if attempt == self.max_retries - 1 or not is_transient(e):
+                    raise
+                delay = min(60.0, 2**attempt) * random.uniform(0.5, 1.5)
+                print(f"Embedding batch failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        return []
+
+    def run(self, pdf_files: list[str]) -> dict[str, str]:
+        """Make sure every file is in the index; returns {path: key} for the ones that are"""
+        keys = {}
+        for pdf_file in pdf_files:
+            try:
+                content_hash = self.index_cache.content_hash(pdf_file)
+            except OSError as e:
+                print(f"Error loading {pdf_file}: {str(e)}")
+                continue
+            self.content_hashes[pdf_file] = content_hash
+            keys[pdf_file] = self.index_cache.entry_key(content_hash)
+
+        todo = [path for path, key in keys.items() if not self.index_cache.has(key)]
+        for path in keys:
+            if path not in todo:
+                print(f"Loading from index: {path}")
+
+        if todo:
+            with timed("rag_ingest_seconds", "ingest"):
+                self._ingest(todo, keys)
+
+        return {path: key for path, key in keys.items() if self.index_cache.has(key)}
+
+    def _ingest(self, pdf_files: list[str], keys: dict[str, str]):
+        pending: dict[str, PendingFile] = {}
+        batch: list[tuple[str, int]] = []
+        batch_tokens = 0
+        embed_futures: dict[Future, list[tuple[str, int]]] = {}
+
+        # Spawn keeps workers free of the parent's threads and open clients
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(pdf_files)),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as parse_pool, ThreadPoolExecutor(max_workers=self.concurrency) as embed_pool:
+
+            def submit_batch():
+                nonlocal batch, batch_tokens
+                if batch:
+                    texts = [pending[path].texts[i] for path, i in batch]
+                    future = embed_pool.submit(self.embed_with_retry, texts, batch_tokens)
+                    embed_futures[future] = batch
+                batch, batch_tokens = [], 0
+
+            parse_futures = {
+                parse_pool.submit(
+                    parse_pdf,
+                    path,
+                    self.chunk_size,
+                    self.chunk_overlap,
+                    self.child_chunk_size,
+                    self.child_chunk_overlap,
+                    self.content_hashes[path],
+                    self.parse_cache.directory if self.parse_cache else None,
+                    self.tokenizer,
+                ): path
+                for path in pdf_files
+            }
+            for path in pdf_files:
+                print(f"Loading: {path}")
+
+            while parse_futures or embed_futures:
+                done, _ = wait(
+                    [*parse_futures, *embed_futures], return_when=FIRST_COMPLETED
+                )
+
+                for future in done:
+                    if future in parse_futures:
+                        path = parse_futures.pop(future)
+                        try:
+                            texts, metadatas, tokens, parents, lexical = future.result()
+                        except Exception as e:
+                            print(f"Error loading {path}: {str(e)}")
+                            continue
+
+                        if not texts:
+                            print(f"No content loaded from {path}")
+                            continue
+
+                        pending[path] = PendingFile(
+                            key=keys[path],
+                            texts=texts,
+                            metadatas=metadatas,
+                            parents=parents,
+                            lexical=lexical,
+                            embeddings=[None] * len(texts),
+                            remaining=len(texts),
+                        )
+                        for i, count in enumerate(tokens):
+                            if batch and (
+                                len(batch) >= self.max_batch_size
+                                or batch_tokens + count > self.max_batch_tokens
+                            ):
+                                submit_batch()
+                            batch.append((path, i))
+                            batch_tokens += count
+                    else:
+                        self._collect(future, embed_futures.pop(future), pending)
+
+                if not parse_futures:
+                    submit_batch()
+
+    def prune_parse_cache(self, pdf_files: list[str]):
+        """Drop cached parses of everything but these files"""
+        if self.parse_cache is not None:
+            self.parse_cache.prune(
+                {self.content_hashes[path] for path in pdf_files if path in self.content_hashes}
+            )
+
+    def _collect(
+        self,
+        future: Future,
+        batch: list[tuple[str, int]],
+        pending: dict[str, PendingFile],
+    ):
+        try:
+            vectors = future.result()
+        except Exception as e:
+            for path in {path for path, _ in batch}:
+                if not pending[path].failed:
+                    print(f"Error embedding {path}: {str(e)}")
+                pending[path].failed = True
+            vectors = [None] * len(batch)
+
+        for (path, i), vector in zip(batch, vectors):
+            entry = pending[path]
+            entry.embeddings[i] = vector
+            entry.remaining -= 1
+
+            if entry.remaining == 0 and not entry.failed:
+                self.index_cache.save(
+                    entry.key,
+                    entry.texts,
+                    entry.metadatas,
+                    entry.embeddings,
+                    entry.parents,
+                    entry.lexical,
+                )
+                print(f"Successfully embedded {len(entry.texts)} chunks from {path}")
+                del pending[path]
+
+
+def main(
+    pdf_directory: Annotated[Optional[str], typer.Option()] = None,
+    index_directory: Annotated[Optional[str], typer.Option()] = None,
+    workers: Annotated[
+        Optional[int], typer.Option(help="Processes parsing and splitting PDFs")
+    ] = None,
+    concurrency: Annotated[
+        Optional[int], typer.Option(help="Embedding requests in flight")
+    ] = None,
+):
+    """Embed every new or changed PDF and write the search snapshot used by the server"""
+    from config import Settings
+    from vector_store.vector_store import PDFVectorStore
+
+    overrides = {
+        "pdf_directory": pdf_directory,
+        "index_directory": index_directory,
+        "ingest_workers": workers,
+        "ingest_concurrency": concurrency,
+    }
+    settings = Settings.from_env().model_copy(
+        update={name: value for name, value in overrides.items() if value is not None}
+    )
+
+    started = time.perf_counter()
+    vector_store = PDFVectorStore.from_settings(settings)
+    print(
+        f"Indexed {len(vector_store.manifest)} files, {len(vector_store.texts)} chunks "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    typer.run(main)
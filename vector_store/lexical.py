@@ -0,0 +1,138 @@
+import re
+import numpy as np
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    """
+    a an and are as at be but by for from has have how in is it its of on or that
+    the their this to was were what when which who why with
+    """.split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS
+    ]
+
+
+class LexicalSegment:
+    """Term postings of one file's chunks, computed once at ingestion and stored with
+    its index entry; ids are chunk positions within the file.
+    """
+
+    def __init__(
+        self,
+        lengths: np.ndarray,
+        postings: dict[str, tuple[np.ndarray, np.ndarray]],
+    ):
+        self.lengths = lengths
+        self.postings = postings
+
+    @classmethod
+    def from_texts(cls, texts: list[str]) -> "LexicalSegment":
+        counts = [Counter(tokenize(text)) for text in texts]
+        ids: dict[str, list[int]] = {}
+        frequencies: dict[str, list[int]] = {}
+        for doc_id, doc_counts in enumerate(counts):
+            for term, frequency in doc_counts.items():
+                ids.setdefault(term, []).append(doc_id)
+                frequencies.setdefault(term, []).append(frequency)
+
+        return cls(
+            np.array([sum(c.values()) for c in counts], dtype=np.float32),
+            {
+                term: (
+                    np.array(term_ids, dtype=np.int64),
+                    np.array(frequencies[term], dtype=np.float32),
+                )
+                for term, term_ids in ids.items()
+            },
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "lengths": self.lengths.astype(int).tolist(),
+            "postings": {
+                term: [doc_ids.tolist(), tf.astype(int).tolist()]
+                for term, (doc_ids, tf) in self.postings.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LexicalSegment":
+        return cls(
+            np.array(data["lengths"], dtype=np.float32),
+            {
+                term: (np.array(doc_ids, dtype=np.int64), np.array(tf, dtype=np.float32))
+                for term, (doc_ids, tf) in data["postings"].items()
+            },
+        )
+
+
+class BM25Index:
+    """Okapi BM25 over the stored postings of every file in the corpus.
+
+    Building only lays the files' segments side by side, so publishing an update
+    never re-tokenizes the corpus; corpus statistics (document frequencies, average
+    length) are applied at query time to the postings of the query's terms.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = 0
+        self.average_length = 1.0
+        # (row of the segment's first chunk in the corpus, segment)
+        self.segments: list[tuple[int, LexicalSegment]] = []
+
+    def build(self, texts: list[str]):
+        self.build_from_segments([LexicalSegment.from_texts(texts)])
+
+    def build_from_segments(self, segments: list[LexicalSegment]):
+        self.segments = []
+        offset = 0
+        total_length = 0.0
+        for segment in segments:
+            self.segments.append((offset, segment))
+            offset += len(segment.lengths)
+            total_length += float(segment.lengths.sum())
+        self.size = offset
+        self.average_length = max(total_length / offset, 1.0) if offset else 1.0
+
+    def search(self, query: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, scores) of the k best matching chunks, best first"""
+        terms = set(tokenize(query))
+        hits = []
+        frequencies: Counter[str] = Counter()
+        for offset, segment in self.segments:
+            for term in terms:
+                posting = segment.postings.get(term)
+                if posting is not None:
+                    hits.append((term, offset, segment, posting))
+                    frequencies[term] += len(posting[0])
+
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term, offset, segment, (doc_ids, tf) in hits:
+            frequency = frequencies[term]
+            idf = np.log(1 + (self.size - frequency + 0.5) / (frequency + 0.5))
+            norm = self.k1 * (
+                1 - self.b + self.b * segment.lengths[doc_ids] / self.average_length
+            )
+            scores[offset + doc_ids] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        # Only chunks sharing a term with the query are ranked
+        matches = np.flatnonzero(scores)
+        top = matches[np.argsort(-scores[matches], kind="stable")[:k]]
+        return top, scores[top]
+
+
+def reciprocal_rank_fusion(rankings: list[np.ndarray], k: int = 60) -> list[int]:
+    """Merge ranked id lists by summing 1 / (k + rank) for each list an id appears in"""
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking.tolist(), start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused, key=fused.__getitem__, reverse=True)
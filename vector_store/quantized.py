@@ -0,0 +1,65 @@
+import numpy as np
+from typing import Literal, Optional
+
+Precision = Literal["float32", "float16", "int8"]
+
+BLOCK_ROWS = 16384
+
+
+def quantize(
+    vectors: np.ndarray, precision: Precision
+) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """Return (codes, per-row scales); scales are only used for int8"""
+    if precision == "float16":
+        return vectors.astype(np.float16), None
+    if precision == "int8":
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    return vectors.astype(np.float32), None
+
+
+class QuantizedVectors:
+    """Compact (float16 or int8) embeddings, usually memory-mapped, with the exact
+    float32 vectors kept alongside for re-ranking a handful of candidates.
+    """
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        scales: Optional[np.ndarray],
+        exact: np.ndarray,
+    ):
+        self.codes = codes
+        self.scales = scales
+        self.exact = exact
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self.codes.shape
+
+    def approximate_scores(
+        self, query: np.ndarray, ids: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Scores of every row, or only of the rows `ids`, computed from the codes"""
+        if ids is not None:
+            scores = self.codes[ids].astype(np.float32) @ query
+            if self.scales is not None:
+                scores *= self.scales[ids]
+            return scores
+
+        # Cast block by block so a query never materializes a full float32 copy
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), BLOCK_ROWS):
+            block = self.codes[start : start + BLOCK_ROWS].astype(np.float32)
+            scores[start : start + BLOCK_ROWS] = block @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def exact_scores(self, ids: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # Only the candidate rows of the float32 file are paged in
+        return np.asarray(self.exact[ids], dtype=np.float32) @ query
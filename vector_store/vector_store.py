@@ -1,100 +1,681 @@
 import os
+import copy
+import asyncio
 import glob
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.vectorstores import SKLearnVectorStore
+import hashlib
+import threading
+import numpy as np
+from abc import ABC, abstractmethod
 from langchain_openai import OpenAIEmbeddings
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from dataclasses import dataclass, field
+from typing import Optional, Literal, Union, TYPE_CHECKING
 from dotenv import load_dotenv
+from pdf_loader.pdf_loader import split_hierarchy
+from pdf_loader.structured import PARSER_VERSION, ParseCache
+from tokenizer.tokenizer import Tokenizer
+from vector_store.index_cache import IndexCache
+from vector_store.ingest import IngestionPipeline
+from vector_store.lexical import BM25Index, LexicalSegment, reciprocal_rank_fusion
+from vector_store.quantized import Precision, QuantizedVectors
+
+if TYPE_CHECKING:
+    from config import Settings
 
 load_dotenv()
 
 
-class URLVectorStore:
-    def __init__(self):
+class VectorIndex(ABC):
+    """Nearest-neighbour search over unit-normalized float32 vectors, scored by inner product"""
+
+    @abstractmethod
+    def build(self, vectors: Union[np.ndarray, QuantizedVectors]): ...
+
+    @abstractmethod
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, scores) of the k best matches, best first"""
+
+
+def top_k_scores(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class BruteForceIndex(VectorIndex):
+    """Exact search over one contiguous float32 matrix; best for small corpora.
+
+    Given QuantizedVectors it scans the compact codes instead and re-ranks the
+    best `rerank_candidates` rows with their exact float32 vectors.
+    """
+
+    def __init__(self, rerank_candidates: int = 50):
+        self.rerank_candidates = rerank_candidates
+        self.vectors: Union[np.ndarray, QuantizedVectors] = np.empty(
+            (0, 0), dtype=np.float32
+        )
+
+    def build(self, vectors: Union[np.ndarray, QuantizedVectors]):
+        if isinstance(vectors, QuantizedVectors):
+            self.vectors = vectors
+        else:
+            self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        if len(self.vectors) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if isinstance(self.vectors, QuantizedVectors):
+            approximate = self.vectors.approximate_scores(query)
+            candidates = top_k_scores(approximate, max(k, self.rerank_candidates))
+            scores = self.vectors.exact_scores(candidates, query)
+            top = top_k_scores(scores, k)
+            return candidates[top], scores[top]
+
+        scores = self.vectors @ query
+        top = top_k_scores(scores, k)
+        return top, scores[top]
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index: vectors are clustered with spherical k-means and a query
+    only scans the `nprobe` clusters whose centroids are closest to it.
+
+    Raising `nprobe` trades latency for recall; corpora smaller than
+    `min_train_size` are searched exactly. Lists only hold row ids, vectors stay
+    in the (memory-mapped) matrix: with QuantizedVectors the probed rows are
+    scored from their codes and the best `rerank_candidates` re-ranked exactly.
+    """
+
+    def __init__(
+        self,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        train_iterations: int = 10,
+        min_train_size: int = 1024,
+        seed: int = 0,
+        rerank_candidates: int = 50,
+    ):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.min_train_size = min_train_size
+        self.seed = seed
+        self.rerank_candidates = rerank_candidates
+        self.exact = BruteForceIndex(rerank_candidates=rerank_candidates)
+        self.centroids: Optional[np.ndarray] = None
+        self.vectors: Union[np.ndarray, QuantizedVectors] = np.empty(
+            (0, 0), dtype=np.float32
+        )
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), 65536):
+            block = vectors[start : start + 65536]
+            assignments[start : start + 65536] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def _train(self, vectors: np.ndarray, nlist: int) -> np.ndarray:
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(vectors), nlist * 64)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.train_iterations):
+            assignments = self._assign(sample, centroids)
+            for cluster in range(nlist):
+                members = sample[assignments == cluster]
+                if len(members) == 0:
+                    # Re-seed empty clusters so every list stays useful
+                    centroids[cluster] = sample[rng.integers(sample_size)]
+                else:
+                    centroids[cluster] = members.sum(axis=0)
+            centroids /= np.maximum(
+                np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12
+            )
+
+        return centroids
+
+    def build(self, vectors: Union[np.ndarray, QuantizedVectors]):
+        if len(vectors) < self.min_train_size:
+            self.centroids = None
+            self.exact.build(vectors)
+            return
+
+        self.vectors = vectors
+        # Cluster on the exact vectors, read block by block from the memory map
+        exact = vectors.exact if isinstance(vectors, QuantizedVectors) else vectors
+        nlist = self.nlist or max(1, int(np.sqrt(len(exact))))
+        self.centroids = self._train(exact, nlist)
+
+        assignments = self._assign(exact, self.centroids)
+        # Row ids grouped by list, ascending within each list for sequential reads
+        self.list_ids = np.argsort(assignments, kind="stable")
+        self.list_offsets = np.searchsorted(
+            assignments[self.list_ids], np.arange(nlist + 1), side="left"
+        )
+
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        if self.centroids is None:
+            return self.exact.search(query, k)
+
+        probes = top_k_scores(self.centroids @ query, self.nprobe)
+        ids = np.sort(
+            np.concatenate(
+                [
+                    self.list_ids[self.list_offsets[c] : self.list_offsets[c + 1]]
+                    for c in probes
+                ]
+            )
+        )
+
+        if isinstance(self.vectors, QuantizedVectors):
+            approximate = self.vectors.approximate_scores(query, ids)
+            candidates = ids[top_k_scores(approximate, max(k, self.rerank_candidates))]
+            scores = self.vectors.exact_scores(candidates, query)
+            top = top_k_scores(scores, k)
+            return candidates[top], scores[top]
+
+        scores = np.asarray(self.vectors[ids], dtype=np.float32) @ query
+        top = top_k_scores(scores, k)
+        return ids[top], scores[top]
+
+
+def make_index(
+    kind: Literal["brute_force", "ivf"] = "brute_force",
+    nlist: Optional[int] = None,
+    nprobe: int = 8,
+    rerank_candidates: int = 50,
+) -> VectorIndex:
+    if kind == "ivf":
+        return IVFIndex(nlist=nlist, nprobe=nprobe, rerank_candidates=rerank_candidates)
+    return BruteForceIndex(rerank_candidates=rerank_candidates)
+
+
+@dataclass
+class Corpus:
+    texts: list[str]
+    metadatas: list[dict]
+    embeddings: Union[np.ndarray, QuantizedVectors]
+    index: VectorIndex
+    lexical: Optional[BM25Index] = None
+    # Parent sections returned in place of the small chunks that were matched
+    parents: list[str] = field(default_factory=list)
+    parent_ids: Optional[np.ndarray] = None
+
+
+class IndexedVectorStore:
+    """Chunk texts and metadata held in memory, searched through a pluggable VectorIndex.
+
+    Updates build a complete new Corpus and swap it in with one assignment, so
+    searches running concurrently always see a consistent view. With `hybrid`,
+    a BM25 index is built next to the vector index and the two rankings of
+    `hybrid_candidates` chunks each are merged with reciprocal rank fusion.
+
+    When chunks carry a `parent_id`, the best matching chunks are searched but
+    their parent sections are returned, one document per parent.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        index: Optional[VectorIndex] = None,
+        top_k: int = 4,
+        hybrid: bool = False,
+        hybrid_candidates: int = 20,
+        rrf_k: int = 60,
+    ):
+        self.embedding = embedding
+        self.index_prototype = copy.deepcopy(index or BruteForceIndex())
+        self.top_k = top_k
+        self.hybrid = hybrid
+        self.hybrid_candidates = hybrid_candidates
+        self.rrf_k = rrf_k
+
+        self.corpus = Corpus(
+            texts=[],
+            metadatas=[],
+            embeddings=np.empty((0, 0), dtype=np.float32),
+            index=self.new_index(),
+        )
+
+    @property
+    def texts(self) -> list[str]:
+        return self.corpus.texts
+
+    @property
+    def metadatas(self) -> list[dict]:
+        return self.corpus.metadatas
+
+    @property
+    def embeddings(self) -> Union[np.ndarray, QuantizedVectors]:
+        return self.corpus.embeddings
+
+    @property
+    def index(self) -> VectorIndex:
+        return self.corpus.index
+
+    def new_index(self) -> VectorIndex:
+        return copy.deepcopy(self.index_prototype)
+
+    def publish(
+        self,
+        texts: list[str],
+        metadatas: list[dict],
+        embeddings: Union[np.ndarray, QuantizedVectors],
+        parents: Optional[list[str]] = None,
+        lexical_segments: Optional[list[LexicalSegment]] = None,
+    ):
+        """Swap in a new corpus; `parent_id` in each metadata indexes into `parents`.
+
+        With hybrid search, `lexical_segments` are the stored postings of the texts
+        in order; without them the texts are tokenized here.
+        """
+        index = self.new_index()
+        index.build(embeddings)
+
+        lexical = None
+        if self.hybrid:
+            lexical = BM25Index()
+            if lexical_segments is not None:
+                lexical.build_from_segments(lexical_segments)
+            else:
+                lexical.build(texts)
+
+        parent_ids = None
+        if parents:
+            parent_ids = np.array(
+                [metadata.get("parent_id", -1) for metadata in metadatas],
+                dtype=np.int64,
+            )
+
+        self.corpus = Corpus(
+            texts, metadatas, embeddings, index, lexical, parents or [], parent_ids
+        )
+
+    def add_embedded_chunks(
+        self,
+        texts: list[str],
+        metadatas: list[dict],
+        embeddings: np.ndarray,
+        parents: Optional[list[str]] = None,
+    ):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        offset = len(self.corpus.parents)
+        if parents:
+            metadatas = [
+                {**metadata, "parent_id": metadata["parent_id"] + offset}
+                for metadata in metadatas
+            ]
+
+        if self.embeddings.size != 0:
+            vectors = np.vstack([self.embeddings, vectors])
+        self.publish(
+            self.texts + texts,
+            self.metadatas + metadatas,
+            vectors,
+            self.corpus.parents + (parents or []),
+        )
+
+    def retrieve_doc(self, question: str):
+        if not self.texts:
+            return []
+
+        return self.search(question, self.embedding.embed_query(question))
+
+    async def aretrieve_doc(self, question: str):
+        if not self.texts:
+            return []
+
+        vector = await self.embedding.aembed_query(question)
+        # The vector scan and BM25 scoring are CPU-bound, keep them off the event loop
+        return await asyncio.to_thread(self.search, question, vector)
+
+    def search(self, question: str, embedding: list[float]) -> list[Document]:
+        """Dense search, fused with BM25 over `question` when the corpus has a lexical index.
+
+        Each returned document carries its exact cosine similarity to the query
+        in `metadata["similarity"]`, whichever ranking found it; a parent section
+        gets the similarity of its best ranked chunk.
+        """
+        corpus = self.corpus
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+
+        # Several chunks can share a parent, so rank extra ones to fill top_k parents
+        limit = self.top_k if corpus.parent_ids is None else self.top_k * 4
+
+        if corpus.lexical is None:
+            ids, _ = corpus.index.search(query, limit)
+        else:
+            candidates = max(limit, self.hybrid_candidates)
+            dense_ids, _ = corpus.index.search(query, candidates)
+            lexical_ids, _ = corpus.lexical.search(question, candidates)
+            ids = reciprocal_rank_fusion([dense_ids, lexical_ids], k=self.rrf_k)
+            ids = ids[:limit]
+
+        ids = np.asarray(ids, dtype=np.int64)
+        if isinstance(corpus.embeddings, QuantizedVectors):
+            similarities = corpus.embeddings.exact_scores(ids, query)
+        else:
+            similarities = np.asarray(corpus.embeddings[ids], dtype=np.float32) @ query
+
+        documents: list[Document] = []
+        seen_parents: set[int] = set()
+        for i, similarity in zip(ids.tolist(), similarities):
+            text = corpus.texts[i]
+            if corpus.parent_ids is not None and corpus.parent_ids[i] >= 0:
+                parent = int(corpus.parent_ids[i])
+                if parent in seen_parents:
+                    continue
+                seen_parents.add(parent)
+                text = corpus.parents[parent]
+
+            documents.append(
+                Document(
+                    page_content=text,
+                    metadata={**corpus.metadatas[i], "similarity": float(similarity)},
+                )
+            )
+            if len(documents) == self.top_k:
+                break
+
+        return documents
+
+
+class URLVectorStore(IndexedVectorStore):
+    def __init__(
+        self,
+        embedding: Optional[Embeddings] = None,
+        index: Optional[VectorIndex] = None,
+        child_chunk_size: Optional[int] = None,
+    ):
         urls = [
             "https://lilianweng.github.io/posts/2023-06-23-agent/",
             "https://lilianweng.github.io/posts/2023-03-15-prompt-engineering/",
             "https://lilianweng.github.io/posts/2023-10-25-adv-attack-llm/",
         ]
 
-        self.embedding = OpenAIEmbeddings(model="text-embedding-3-large")
-        self.text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            chunk_size=1000, chunk_overlap=200
-        )
-        self.vectorstore = SKLearnVectorStore(
-            embedding=OpenAIEmbeddings(model="text-embedding-3-large")
+        super().__init__(
+            embedding or OpenAIEmbeddings(model="text-embedding-3-large"), index
         )
-        self.retriever = self.vectorstore.as_retriever(kwargs={"k": 3})
+        self.child_chunk_size = child_chunk_size
 
         for _, v in enumerate(urls):
             self.insert_doc(v)
 
     def insert_doc(self, url: str):
-        docs = WebBaseLoader(url).load()
-        doc_splits = self.text_splitter.split_documents(docs)
-        self.vectorstore.add_documents(doc_splits)
+        # Deferred: langchain_community's loaders are slow to import
+        from langchain_community.document_loaders import WebBaseLoader
 
-    def retrieve_doc(self, question: str):
-        return self.retriever.invoke(question)
+        docs = WebBaseLoader(url).load()
+        texts, metadatas, parents = split_hierarchy(
+            docs, chunk_size=1000, chunk_overlap=200, child_chunk_size=self.child_chunk_size
+        )
+        self.add_embedded_chunks(
+            texts, metadatas, self.embedding.embed_documents(texts), parents
+        )
 
 
-class PDFVectorStore:
-    def __init__(self, pdf_directory="./paper"):
-        self.pdf_directory = pdf_directory
-        self.embedding = OpenAIEmbeddings(model="text-embedding-3-large")
-        self.text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            chunk_size=1000, chunk_overlap=200
+class PDFVectorStore(IndexedVectorStore):
+    def __init__(
+        self,
+        pdf_directory="./paper",
+        index_directory="./index",
+        embedding_model="text-embedding-3-large",
+        embedding_dimensions: Optional[int] = None,
+        chunk_size=1000,
+        chunk_overlap=200,
+        child_chunk_size: Optional[int] = None,
+        child_chunk_overlap: int = 0,
+        tokenizer: Tokenizer = "tiktoken",
+        top_k=4,
+        hybrid: bool = False,
+        hybrid_candidates: int = 20,
+        rrf_k: int = 60,
+        precision: Precision = "float32",
+        ingest_workers: Optional[int] = None,
+        ingest_concurrency: int = 4,
+        embedding: Optional[Embeddings] = None,
+        index: Optional[VectorIndex] = None,
+    ):
+        super().__init__(
+            embedding
+            or OpenAIEmbeddings(model=embedding_model, dimensions=embedding_dimensions),
+            index,
+            top_k,
+            hybrid=hybrid,
+            hybrid_candidates=hybrid_candidates,
+            rrf_k=rrf_k,
         )
-        self.vectorstore = SKLearnVectorStore(
-            embedding=OpenAIEmbeddings(model="text-embedding-3-large")
+        self.pdf_directory = pdf_directory
+        self.precision = precision
+
+        index_settings = {
+            "loader": f"pypdf-structured-v{PARSER_VERSION}",
+            "embedding_model": embedding_model,
+            "embedding_dimensions": embedding_dimensions,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+        }
+        if child_chunk_size is not None:
+            # Only part of the key when enabled, so flat indexes stay valid
+            index_settings["child_chunk_size"] = child_chunk_size
+            index_settings["child_chunk_overlap"] = child_chunk_overlap
+        if tokenizer != "tiktoken":
+            # Chunks are cut at different places
+            index_settings["tokenizer"] = tokenizer
+        self.index_cache = IndexCache(index_directory, settings=index_settings)
+
+        self.ingestion = IngestionPipeline(
+            self.index_cache,
+            self.embedding,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            child_chunk_size=child_chunk_size,
+            child_chunk_overlap=child_chunk_overlap,
+            tokenizer=tokenizer,
+            workers=ingest_workers,
+            concurrency=ingest_concurrency,
+            parse_cache=ParseCache(os.path.join(index_directory, "parsed")),
         )
-        self.retriever = self.vectorstore.as_retriever(kwargs={"k": 3})
+
+        # path -> (cache key, chunk texts, chunk metadata, parent sections, term postings)
+        # for every indexed document
+        self.documents: dict[
+            str, tuple[str, list[str], list[dict], list[str], Optional[LexicalSegment]]
+        ] = {}
+        self.file_stats: dict[str, tuple[int, int]] = {}
+        self.lock = threading.Lock()
 
         self.load_all_pdfs()
 
+    @classmethod
+    def from_settings(
+        cls,
+        settings: "Settings",
+        embedding: Optional[Embeddings] = None,
+        index: Optional[VectorIndex] = None,
+    ) -> "PDFVectorStore":
+        return cls(
+            pdf_directory=settings.pdf_directory,
+            index_directory=settings.index_directory,
+            embedding_model=settings.embedding_model,
+            embedding_dimensions=settings.embedding_dimensions,
+            chunk_size=settings.chunk_size,
+            chunk_overlap=settings.chunk_overlap,
+            child_chunk_size=settings.child_chunk_size,
+            child_chunk_overlap=settings.child_chunk_overlap,
+            tokenizer=settings.tokenizer,
+            top_k=settings.top_k,
+            hybrid=settings.retrieval_mode == "hybrid",
+            hybrid_candidates=settings.hybrid_candidates,
+            rrf_k=settings.rrf_k,
+            precision=settings.vector_precision,
+            ingest_workers=settings.ingest_workers,
+            ingest_concurrency=settings.ingest_concurrency,
+            embedding=embedding,
+            index=index
+            or make_index(
+                settings.vector_index,
+                nlist=settings.ivf_nlist,
+                nprobe=settings.ivf_nprobe,
+                rerank_candidates=settings.rerank_candidates,
+            ),
+        )
+
     def load_all_pdfs(self):
-        """Load all PDF files from the specified directory"""
-        pdf_files = glob.glob(os.path.join(self.pdf_directory, "*.pdf"))
+        """Load all PDF files from the specified directory, embedding only new or changed ones"""
+        self.sync_directory(force=True)
+        print(f"Total PDF files processed: {len(self.documents)}")
 
-        if not pdf_files:
-            print(f"No PDF files found in {self.pdf_directory}")
-            return
+    @property
+    def manifest(self) -> dict[str, str]:
+        return {path: key for path, (key, *_) in self.documents.items()}
 
-        for pdf_file in pdf_files:
-            print(f"Loading: {pdf_file}")
-            self.insert_pdf(pdf_file)
+    @property
+    def corpus_version(self) -> str:
+        """Changes whenever a PDF is added, removed or modified"""
+        keys = "\n".join(sorted(self.manifest.values()))
+        return hashlib.sha256(keys.encode()).hexdigest()
 
-        print(f"Total PDF files processed: {len(pdf_files)}")
+    def _in_directory(self, path: str) -> bool:
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(
+            self.pdf_directory
+        )
 
-    def insert_pdf(self, pdf_path: str):
-        try:
-            loader = PyPDFLoader(file_path=pdf_path, mode="single", pages_delimiter="")
+    @staticmethod
+    def _stat(path: str) -> tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
 
-            docs = []
-            docs_lazy = loader.lazy_load()
+    def sync_directory(self, force: bool = False) -> dict[str, list[str]]:
+        """Bring the index in line with `pdf_directory`.
 
-            for doc in docs_lazy:
-                docs.append(doc)
+        Files whose size and mtime are unchanged are skipped unless `force`, in
+        which case every file is re-hashed.
+        """
+        pdf_files = sorted(glob.glob(os.path.join(self.pdf_directory, "*.pdf")))
+        if not pdf_files:
+            print(f"No PDF files found in {self.pdf_directory}")
 
-            if docs:
-                doc_splits = self.text_splitter.split_documents(docs)
-                self.vectorstore.add_documents(doc_splits)
-                print(f"Successfully added {len(doc_splits)} chunks from {pdf_path}")
-            else:
-                print(f"No content loaded from {pdf_path}")
+        changed = [
+            path
+            for path in pdf_files
+            if force or self.file_stats.get(path) != self._stat(path)
+        ]
+        removed = [
+            path
+            for path in self.documents
+            if self._in_directory(path) and path not in pdf_files
+        ]
+        return self.apply_changes(upserts=changed, deletes=removed)
+
+    def upsert_pdf(self, pdf_path: str) -> dict[str, list[str]]:
+        return self.apply_changes(upserts=[pdf_path], deletes=[])
 
-        except Exception as e:
-            print(f"Error loading {pdf_path}: {str(e)}")
+    def delete_pdf(self, pdf_path: str) -> dict[str, list[str]]:
+        return self.apply_changes(upserts=[], deletes=[pdf_path])
 
     def add_single_pdf(self, pdf_path: str):
         if os.path.exists(pdf_path):
-            self.insert_pdf(pdf_path)
+            self.upsert_pdf(pdf_path)
         else:
             print(f"PDF file not found: {pdf_path}")
 
-    def retrieve_doc(self, question: str):
-        return self.retriever.invoke(question)
+    def apply_changes(
+        self, upserts: list[str], deletes: list[str]
+    ) -> dict[str, list[str]]:
+        """Upsert and delete documents by path, embedding only content not yet in the index"""
+        # The file lock makes other processes wait, then find the new entries already
+        # embedded instead of ingesting the same files again
+        with self.lock, self.index_cache.writer_lock():
+            changes: dict[str, list[str]] = {"added": [], "updated": [], "deleted": []}
+            documents = dict(self.documents)
+
+            for path in deletes:
+                if documents.pop(path, None) is not None:
+                    self.file_stats.pop(path, None)
+                    changes["deleted"].append(path)
+
+            stats = {path: self._stat(path) for path in upserts if os.path.exists(path)}
+            keys = self.ingestion.run(list(stats))
+
+            for path in stats:
+                key = keys.get(path)
+                if key is None:
+                    continue
+                self.file_stats[path] = stats[path]
+
+                current = documents.get(path)
+                if current is not None and current[0] == key:
+                    continue
+
+                doc_id = document_id(path, key)
+                texts, metadatas, parents, lexical = self.index_cache.load_chunks(key)
+                metadatas = [{**metadata, "doc_id": doc_id} for metadata in metadatas]
+                segment = None
+                if self.hybrid:
+                    # Entries written before postings were stored are tokenized once here
+                    segment = (
+                        LexicalSegment.from_dict(lexical)
+                        if lexical is not None
+                        else LexicalSegment.from_texts(texts)
+                    )
+                documents[path] = (key, texts, metadatas, parents, segment)
+                changes["updated" if current is not None else "added"].append(path)
+
+            if any(changes.values()):
+                self._publish_documents(documents)
+                for change, paths in changes.items():
+                    for path in paths:
+                        print(f"Index {change}: {path}")
+
+            return changes
+
+    def _publish_documents(
+        self,
+        documents: dict[
+            str, tuple[str, list[str], list[dict], list[str], Optional[LexicalSegment]]
+        ],
+    ):
+        keys, texts, metadatas, parents, segments = [], [], [], [], []
+        for key, chunk_texts, chunk_metadatas, chunk_parents, segment in (
+            documents.values()
+        ):
+            keys.append(key)
+            segments.append(segment)
+            texts.extend(chunk_texts)
+            # Parent ids are stored per file; shift them to positions in the corpus
+            offset = len(parents)
+            metadatas.extend(
+                {**metadata, "parent_id": metadata["parent_id"] + offset}
+                if "parent_id" in metadata
+                else metadata
+                for metadata in chunk_metadatas
+            )
+            parents.extend(chunk_parents)
+
+        embeddings = np.empty((0, 0), dtype=np.float32)
+        if keys:
+            embeddings = self.index_cache.load_vectors(keys, self.precision)
+
+        self.publish(
+            texts, metadatas, embeddings, parents, segments if self.hybrid else None
+        )
+        self.documents = documents
+        self.index_cache.prune(set(self.manifest.values()))
+        self.ingestion.prune_parse_cache(list(documents))
+
+
+def document_id(pdf_path: str, key: str) -> str:
+    """Stable ID for one version of one document: its absolute path plus content key"""
+    return hashlib.sha256(f"{os.path.abspath(pdf_path)}\n{key}".encode()).hexdigest()[:16]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,34 @@
+import asyncio
+from typing import Optional
+from vector_store.vector_store import PDFVectorStore
+
+
+class DirectoryWatcher:
+    """Polls the store's `pdf_directory` and applies added, changed or deleted PDFs in the background"""
+
+    def __init__(self, vector_store: PDFVectorStore, interval_seconds: float = 30.0):
+        self.vector_store = vector_store
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def poll(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                # Ingestion is blocking work, keep it off the event loop
+                await asyncio.to_thread(self.vector_store.sync_directory)
+            except Exception as e:
+                print(f"Error syncing {self.vector_store.pdf_directory}: {str(e)}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None